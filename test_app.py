@@ -0,0 +1,111 @@
+r""" 测试 WSGI 和 ASGI 应用
+
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> from url_router.app import WSGIApp, ASGIApp
+>>> m = Map([
+...     Rule('/', endpoint='index'),
+...     Rule('/bar/', endpoint='bar'),
+...     Rule('/user/<int:id>', endpoint='user', methods=['GET']),
+...     Rule('/', subdomain='api', endpoint='api'),
+... ])
+
+
+WSGI 视图接收匹配到的参数
+>>> app = WSGIApp(m, server_name='example.org')
+>>> @app.view('user')
+... def user(environ, start_response, args):
+...     start_response('200 OK', [('Content-Type', 'text/plain')])
+...     url = environ['url_router.adapter'].build('user', args)
+...     return [('user %d at %s' % (args['id'], url)).encode()]
+...
+>>> app.views['api'] = lambda environ, start_response, args: [b'api']
+>>> def request(app, path, method='GET', host='example.org', query=''):
+...     def start_response(status, headers):
+...         print(status, headers)
+...     environ = {'wsgi.url_scheme': 'http', 'HTTP_HOST': host,
+...                'SCRIPT_NAME': '', 'PATH_INFO': path,
+...                'REQUEST_METHOD': method, 'QUERY_STRING': query}
+...     print(b''.join(app(environ, start_response)))
+...
+>>> request(app, '/user/42')
+200 OK [('Content-Type', 'text/plain')]
+b'user 42 at /user/42'
+>>> request(app, '/', host='api.example.org')
+b'api'
+
+
+路由异常变成响应，重定向保留 query string
+>>> request(app, '/missing')
+404 Not Found [('Content-Type', 'text/plain; charset=utf-8'), ('Content-Length', '9')]
+b'Not Found'
+>>> request(app, '/user/42', 'POST')  # doctest: +NORMALIZE_WHITESPACE
+405 Method Not Allowed [('Allow', 'GET'),
+    ('Content-Type', 'text/plain; charset=utf-8'), ('Content-Length', '18')]
+b'Method Not Allowed'
+>>> request(app, '/bar', query='a=1')  # doctest: +NORMALIZE_WHITESPACE
+308 Permanent Redirect [('Location', 'http://example.org/bar/?a=1'),
+    ('Content-Type', 'text/plain; charset=utf-8'), ('Content-Length', '0')]
+b''
+>>> request(app, '/', host='example.com')
+404 Not Found [('Content-Type', 'text/plain; charset=utf-8'), ('Content-Length', '9')]
+b'Not Found'
+>>> request(app, '/')
+Traceback (most recent call last):
+    ...
+LookupError: no view for the endpoint 'index'
+
+
+每个 host 只拆分一次子域名，之后使用缓存的 adapter
+>>> adapter = app.get_adapter('api.example.org', '/', 'http')
+>>> adapter.subdomain
+'api'
+>>> app.get_adapter('api.example.org', '/', 'http') is adapter
+True
+>>> sorted(key[0] for key in app._adapters._data)
+['api.example.org', 'example.com', 'example.org']
+
+
+ASGI 应用使用协程视图
+>>> import asyncio
+>>> def run(coro):
+...     # 每次一个新的事件循环，Python 3.6 没有 asyncio.run
+...     loop = asyncio.new_event_loop()
+...     try:
+...         return loop.run_until_complete(coro)
+...     finally:
+...         loop.close()
+...
+>>> async def index(scope, receive, send, args):
+...     await send({'type': 'http.response.start', 'status': 200,
+...                 'headers': []})
+...     await send({'type': 'http.response.body',
+...                 'body': scope['url_router.adapter'].build('index').encode()})
+...
+>>> asgi = ASGIApp(m, {'index': index})
+>>> async def asgi_request(path, method='GET', root_path=''):
+...     sent = []
+...     async def send(message):
+...         sent.append(message)
+...     scope = {'type': 'http', 'scheme': 'http', 'method': method,
+...              'path': root_path + path, 'root_path': root_path,
+...              'query_string': b'', 'server': ('example.org', 8000),
+...              'headers': []}
+...     await asgi(scope, None, send)
+...     return [(message.get('status'), message.get('body'))
+...             for message in sent]
+...
+>>> run(asgi_request('/', root_path='/app'))
+[(200, None), (None, b'/app/')]
+>>> run(asgi_request('/bar', root_path='/app'))
+[(308, None), (None, b'')]
+>>> run(asgi_request('/user/1', 'DELETE'))
+[(405, None), (None, b'Method Not Allowed')]
+>>> sorted(asgi._adapters._data)
+[('example.org:8000', '/', 'http'), ('example.org:8000', '/app', 'http')]
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
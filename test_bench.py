@@ -0,0 +1,45 @@
+""" 测试基准测试的路由表
+
+每个路由表的探测路径得到预期的结果
+>>> from url_router.map import Map
+>>> from url_router.bench import TABLES, compare
+>>> from url_router.exceptions import NotFound, RequestRedirect
+>>> def check(table, count):
+...     rules, probes = TABLES[table](count)
+...     m = Map(rules, engine='regex')
+...     subdomain, path = probes['match']
+...     adapter = m.bind('example.org', '/', subdomain)
+...     endpoint = adapter.match(path)[0]
+...     for probe, exception in ('miss', NotFound), ('redirect', RequestRedirect):
+...         subdomain, path = probes[probe]
+...         try:
+...             m.bind('example.org', '/', subdomain).match(path)
+...         except exception:
+...             pass
+...         else:
+...             return 'no %s for %s' % (exception.__name__, path)
+...     return endpoint, adapter.build(*probes['build']), \\
+...         adapter.build(*probes['build_query']).count('&')
+...
+>>> for table in sorted(TABLES):
+...     print(table, check(table, 10), check(table, 101))
+deep ('view8', '/l0/m0/n8/7/view/hello', 1) ('view100', '/l0/m1/n100/7/view/hello', 1)
+params ('item8', '/p8/42', 1) ('item100', '/p100/42', 1)
+static ('page8', '/s0/page8', 1) ('page100', '/s10/page100', 1)
+subdomains ('t1.user', '/user/42', 1) ('t24.user', '/user/42', 1)
+
+
+比较两次结果，找出变慢的用例
+>>> def document(us):
+...     return {'results': [{'table': 'static', 'size': 10, 'engine': 'trie',
+...                          'case': 'match', 'us': us}]}
+>>> compare(document(1.0), document(1.1))
+[]
+>>> compare(document(1.0), document(1.5))
+[(('static', 10, 'trie', 'match'), 1.0, 1.5)]
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -40,6 +40,45 @@
 'http://example.org/'
 >>> adapter.build('foo', force_external=True)
 'http://example.org/foo'
+
+
+测试 query string 和 script_name
+>>> adapter.build('integer', {'name': 1, 'page': 2})
+'/integer/1?page=2'
+>>> adapter.build('integer', {'sort': '-date', 'name': 1, 'tag': ['a', 'b c']})
+'/integer/1?sort=-date&tag=a&tag=b+c'
+>>> m.bind('example.org', '/app').build('any', {'name': 'value'})
+'/app/any/value'
+
+
+按参数选择规则
+>>> m = Map([
+...     Rule('/<lang>/about', endpoint='about'),
+...     Rule('/about', endpoint='about'),
+...     Rule('/edit', endpoint='edit', methods=['POST']),
+... ])
+>>> adapter = m.bind('example.org', '/')
+>>> adapter.build('about')
+'/about'
+>>> adapter.build('about', {'lang': 'en'})
+'/en/about'
+>>> adapter.build('edit', method='POST')
+'/edit'
+>>> adapter.build('edit')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.BuildError: ('edit', {})
+>>> m.is_endpoint_expecting('about', 'lang')
+True
+>>> m.is_endpoint_expecting('edit', 'lang')
+False
+
+
+批量构建
+>>> list(adapter.build_many('about', [{}, {'lang': 'en'}, {'lang': 'de'}]))
+['/about', '/en/about', '/de/about']
+>>> list(adapter.build_many('about', [{}, {'page': 2}], force_external=True))
+['http://example.org/about', 'http://example.org/about?page=2']
 """
 
 
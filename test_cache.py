@@ -0,0 +1,49 @@
+""" 测试匹配结果缓存
+
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> m = Map([
+...     Rule('/', endpoint='index'),
+...     Rule('/bar/', endpoint='bar'),
+...     Rule('/any/<name>', endpoint='any'),
+... ], cache_size=2)
+>>> adapter = m.bind('example.org', '/')
+
+
+>>> adapter.match('/any/data')
+('any', {'name': 'data'})
+>>> adapter.match('/any/data')
+('any', {'name': 'data'})
+>>> m.cache_info()
+{'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1, 'maxsize': 2}
+
+
+NotFound 和重定向也会缓存
+>>> adapter.match('/missing')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.NotFound
+>>> m.bind('example.org', '/app').match('/bar')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.RequestRedirect: http://example.org/app/bar/
+>>> adapter.match('/bar')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.RequestRedirect: http://example.org/bar/
+>>> m.cache_info()
+{'hits': 2, 'misses': 3, 'evictions': 1, 'size': 2, 'maxsize': 2}
+
+
+添加规则后清空缓存
+>>> m.add(Rule('/missing', endpoint='missing'))
+>>> adapter.match('/missing')
+('missing', {})
+>>> m.cache_info()['size']
+1
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
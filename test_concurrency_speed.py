@@ -0,0 +1,75 @@
+import sys
+import threading
+import time
+from test_engine_speed import make_rules
+from url_router.map import Map
+from url_router.rule import Rule
+from url_router.matcher import MATCHERS
+from url_router.exceptions import NotFound
+
+
+def stress(engine, count, readers, seconds=1.0):
+    """
+    `readers` 个线程不停地匹配和构建固定的规则，同时一个线程不停地添加和删除
+    其他规则。返回每秒的读操作数、每秒的修改数和读到的错误结果数。
+    """
+    m = Map(make_rules(count), engine=engine, cache_size=1000)
+    m.update()
+    stop = threading.Event()
+    reads = [0] * readers
+    errors = []
+    changes = [0]
+
+    def read(n):
+        adapter = m.bind('example.org', '/')
+        i = 0
+        while not stop.is_set():
+            j = i % (count // 2)
+            try:
+                if adapter.match('/dynamic%d/%d' % (j, i)) != \
+                        ('dynamic%d' % j, {'id': i}) or \
+                        adapter.match('/static%d/page' % j) != \
+                        ('static%d' % j, {}) or \
+                        adapter.build('dynamic%d' % j, {'id': 1}) != \
+                        '/dynamic%d/1' % j:
+                    errors.append(j)
+                # 写线程增删的规则，匹配到或者没有都可以
+                adapter.match('/churn/%d' % (i % 10))
+            except NotFound:
+                pass
+            except Exception as e:
+                errors.append(e)
+            i += 1
+        reads[n] = i * 4
+
+    def write():
+        i = 0
+        while not stop.is_set():
+            m.add(Rule('/churn/<int:id>', endpoint='churn%d' % i))
+            m.add(Rule('/churn/%d' % (i % 10), endpoint='churn%d' % i))
+            m.remove('churn%d' % i)
+            i += 1
+        changes[0] = i * 3
+
+    threads = [threading.Thread(target=read, args=(n,))
+               for n in range(readers)]
+    threads.append(threading.Thread(target=write))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(reads) / seconds, changes[0] / seconds, len(errors)
+
+
+if __name__ == "__main__":
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print('GIL %s' % (gil and 'enabled' or 'disabled'))
+    for count in (100, 10000):
+        for engine in sorted(MATCHERS):
+            for readers in (1, 4, 8):
+                ops, changes, errors = stress(engine, count, readers)
+                print('%6d rules %-7s %d readers: %9.0f reads/s %7.0f '
+                      'changes/s  errors: %d' % (count, engine, readers, ops,
+                                                 changes, errors))
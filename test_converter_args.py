@@ -0,0 +1,52 @@
+""" 测试转换器参数
+
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule, parse_converter_args
+>>> m = Map([
+...     Rule('/year/<int(fixed_digits=4, min=1900):year>', endpoint='year'),
+...     Rule('/archive/<int(fixed_digits=4, min=1900):year>', endpoint='archive'),
+...     Rule('/code/<string(length=3):code>', endpoint='code'),
+...     Rule('/name/<string(2, maxlength=8):name>', endpoint='name'),
+... ])
+>>> adapter = m.bind('example.org', '/')
+
+
+>>> adapter.match('/year/2024')
+('year', {'year': 2024})
+>>> adapter.match('/year/0999')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.NotFound
+>>> adapter.match('/code/abc')
+('code', {'code': 'abc'})
+>>> adapter.match('/name/x')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.NotFound
+>>> adapter.build('archive', {'year': 2024})
+'/archive/2024'
+
+
+相同的转换器和参数共用一个实例
+>>> year, archive = m._rules_by_endpoint['year'][0], m._rules_by_endpoint['archive'][0]
+>>> year._converters['year'] is archive._converters['year']
+True
+
+
+只接受字面量
+>>> parse_converter_args("'a', \\"b\\", c, -1, 2.5, None")
+(('a', 'b', 'c', -1, 2.5, None), {})
+>>> parse_converter_args('__import__("os").getcwd()')
+Traceback (most recent call last):
+    ...
+ValueError: malformed converter arguments: '__import__("os").getcwd()'
+>>> parse_converter_args('min=1, 2')
+Traceback (most recent call last):
+    ...
+ValueError: positional converter argument after keyword argument: 'min=1, 2'
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
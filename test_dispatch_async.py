@@ -0,0 +1,81 @@
+r""" 测试 dispatch_async
+
+>>> import asyncio
+>>> import threading
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> from url_router.converters import UnicodeConverter
+>>> from url_router.exceptions import ValidationError
+>>> def run(coro):
+...     # 每次一个新的事件循环，Python 3.6 没有 asyncio.run
+...     loop = asyncio.new_event_loop()
+...     try:
+...         return loop.run_until_complete(coro)
+...     finally:
+...         loop.close()
+...
+
+
+异步转换器，例如在数据库里查 slug，结果按事件循环缓存
+>>> lookups = []
+>>> class SlugConverter(UnicodeConverter):
+...     __slots__ = ()
+...     async def to_python_async(self, value):
+...         lookups.append(value)
+...         await asyncio.sleep(0)
+...         if value not in ('hello', 'world'):
+...             raise ValidationError()
+...         return {'slug': value}
+...
+>>> m = Map([
+...     Rule('/', endpoint='index'),
+...     Rule('/bar/', endpoint='bar'),
+...     Rule('/post/<slug:post>', endpoint='post'),
+...     Rule('/post/<name>', endpoint='page'),
+... ], converters={'slug': SlugConverter}, engine='trie')
+>>> adapter = m.bind('example.org', '/')
+
+
+协程视图函数直接等待，同步视图函数在线程池里运行
+>>> async def async_view(endpoint, args):
+...     return endpoint, args
+...
+>>> def sync_view(endpoint, args):
+...     return endpoint, threading.current_thread().name.startswith('url_router')
+...
+>>> async def main():
+...     print(await adapter.dispatch_async(async_view, '/post/hello'))
+...     print(await adapter.dispatch_async(async_view, '/post/hello'))
+...     print(await adapter.dispatch_async(async_view, '/post/missing'))
+...     print(await adapter.dispatch_async(sync_view, '/'))
+...     redirect = await adapter.dispatch_async(sync_view, '/bar')
+...     print(type(redirect).__name__, redirect)
+...     try:
+...         await adapter.dispatch_async(sync_view, '/missing')
+...     except Exception as e:
+...         print(repr(e))
+...
+>>> run(main())
+('post', {'post': {'slug': 'hello'}})
+('post', {'post': {'slug': 'hello'}})
+('page', {'name': 'missing'})
+('index', True)
+RequestRedirect http://example.org/bar/
+NotFound()
+>>> lookups
+['hello', 'missing']
+
+
+每个事件循环有自己的缓存，同步的 match 不等待异步转换
+>>> run(adapter.match_async('/post/missing', 'GET'))
+('page', {'name': 'missing'})
+>>> lookups
+['hello', 'missing', 'missing']
+>>> adapter.match('/post/world')
+('post', {'post': 'world'})
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
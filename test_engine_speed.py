@@ -0,0 +1,42 @@
+import timeit
+from url_router.map import Map
+from url_router.rule import Rule
+from url_router.matcher import MATCHERS
+
+
+def make_rules(count):
+    """生成 count 条规则，一半静态一半动态"""
+    rules = []
+    for i in range(count // 2):
+        rules.append(Rule('/static%d/page' % i, endpoint='static%d' % i))
+        rules.append(Rule('/dynamic%d/<int:id>' % i, endpoint='dynamic%d' % i))
+    return rules
+
+
+def bench(engine, count, number=1000):
+    m = Map(make_rules(count), engine=engine)
+    m.update()  # 不计入编译时间
+    adapter = m.bind('example.org', '/')
+    last = count // 2 - 1
+    paths = {
+        'first': '/static0/page',
+        'last': '/dynamic%d/42' % last,
+        'miss': '/missing/path',
+    }
+    result = {}
+    for name, path in paths.items():
+        stmt = 'try:\n    match(%r)\nexcept Exception:\n    pass' % path
+        result[name] = timeit.timeit(stmt, globals={'match': adapter.match},
+                                     number=number)
+    return result
+
+
+if __name__ == "__main__":
+    for count in (10, 100, 1000, 10000):
+        number = max(10, 100000 // count)
+        for engine in sorted(MATCHERS):
+            result = bench(engine, count, number)
+            print('%6d rules %-7s %s' % (count, engine, '  '.join(
+                '%s: %.2fus' % (name, seconds / number * 1e6)
+                for name, seconds in sorted(result.items())
+            )))
@@ -0,0 +1,89 @@
+""" 测试解释匹配过程
+
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> def make_map(engine):
+...     return Map([
+...         Rule('/', endpoint='index'),
+...         Rule('/docs/', endpoint='docs'),
+...         Rule('/user/<int(min=1):id>', endpoint='user', methods=['GET']),
+...         Rule('/user/<name>', endpoint='user_name', methods=['POST']),
+...         Rule('/<path:page>', endpoint='page'),
+...     ], engine=engine)
+>>> def explain(adapter, path, method='GET'):
+...     rv = adapter.explain(path, method)
+...     for step in rv['steps']:
+...         print(' '.join(filter(None, (step['rule'].endpoint, step['result'],
+...                                      step['converter']))))
+...     print(rv['outcome'], repr(rv['rule']), rv['args'])
+
+
+linear 引擎检查每一条规则，直到找到允许该方法的规则
+>>> adapter = make_map('linear').bind('example.org', '/')
+>>> adapter.match('/user/0')
+('page', {'page': 'user/0'})
+>>> explain(adapter, '/user/0')
+docs no_match
+index no_match
+user invalid id
+user_name method
+page match
+match <Rule '/<page>' -> page> {'page': 'user/0'}
+>>> explain(adapter, '/docs')
+docs redirect
+redirect <Rule '/docs/' -> docs> None
+>>> explain(adapter, '/user/bob', 'PUT')
+docs no_match
+index no_match
+user no_match
+user_name method
+page match
+match <Rule '/<page>' -> page> {'page': 'user/bob'}
+
+
+trie 引擎只检查路径经过的规则，和 match 的结果相同
+>>> adapter = make_map('trie').bind('example.org', '/')
+>>> explain(adapter, '/user/0')
+user invalid id
+user_name method
+page match
+match <Rule '/<page>' -> page> {'page': 'user/0'}
+>>> m = Map([Rule('/user/<int:id>', endpoint='user', methods=['GET'])],
+...         engine='trie')
+>>> adapter = m.bind('example.org', '/')
+>>> explain(adapter, '/user/1', 'POST')
+user method
+method_not_allowed None None
+>>> explain(adapter, '/missing')
+not_found None None
+
+
+静态表里检查过的规则不再重复列出
+>>> for engine in 'linear', 'trie', 'regex':
+...     m = Map([Rule('/a', endpoint='a', methods=['POST']),
+...              Rule('/<x>', endpoint='x', methods=['PUT'])], engine=engine)
+...     explain(m.bind('example.org', '/'), '/a')
+a method
+x method
+method_not_allowed None None
+a method
+x method
+method_not_allowed None None
+a method
+x method
+method_not_allowed None None
+
+
+regex 引擎的正则式一次检查整个分块
+>>> adapter = make_map('regex').bind('example.org', '/')
+>>> rv = adapter.explain('/user/7')
+>>> [(step['rule'].endpoint, step['result']) for step in rv['steps']]
+[('docs', 'no_match'), ('index', 'no_match'), ('user', 'match')]
+>>> rv['seconds'] == sum(step['seconds'] for step in rv['steps'])
+True
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,90 @@
+""" 测试编译后增删规则
+
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> m = Map([
+...     Rule('/', endpoint='index'),
+...     Rule('/<path:page>', endpoint='page'),
+... ], engine='trie', cache_size=10)
+>>> adapter = m.bind('example.org', '/')
+>>> adapter.match('/user/42')
+('page', {'page': 'user/42'})
+
+
+编译后添加的规则按排序插入，不用重新编译。旧的 CompiledMap 保持不变，
+正在匹配的线程继续使用它
+>>> before = m.update()
+>>> m.add(Rule('/user/<int:id>', endpoint='user'))
+>>> m.add(Rule('/user/me', endpoint='me'))
+>>> adapter.match('/user/42')
+('user', {'id': 42})
+>>> adapter.match('/user/me')
+('me', {})
+>>> adapter.build('user', {'id': 7})
+'/user/7'
+>>> m.update() is before
+False
+>>> before.matcher.match('', 'user/42', 'GET')[0].endpoint
+'page'
+>>> [rule.endpoint for rule in before.rules]
+['index', 'page']
+
+
+删除一条规则或者一个 endpoint 的所有规则
+>>> m.add(Rule('/users/', endpoint='user'))
+>>> m.remove(m._rules_by_endpoint['me'][0])
+>>> adapter.match('/user/me')
+('page', {'page': 'user/me'})
+>>> m.remove('user')
+>>> adapter.match('/user/42')
+('page', {'page': 'user/42'})
+>>> adapter.build('user', {'id': 7})
+Traceback (most recent call last):
+    ...
+url_router.exceptions.BuildError: ('user', {'id': 7})
+>>> m.remove('user')
+Traceback (most recent call last):
+    ...
+LookupError: the endpoint 'user' has no rules
+>>> [rule.endpoint for rule in m.iter_rules()]
+['index', 'page']
+
+
+规则工厂一次添加的多条规则一起插入，编译好的 map 只复制一次
+>>> from url_router.rule import RuleFactory
+>>> class Section(RuleFactory):
+...     def __init__(self, name):
+...         self.name = name
+...     def get_rules(self, map):
+...         yield Rule('/%s/' % self.name, endpoint=self.name)
+...         yield Rule('/%s/<int:id>' % self.name, endpoint=self.name)
+...
+>>> before = m.update()
+>>> m.add(Section('news'))
+>>> adapter.match('/news/'), adapter.match('/news/3')
+(('news', {}), ('news', {'id': 3}))
+>>> [rule.endpoint for rule in before.rules]
+['index', 'page']
+>>> m.remove('news')
+>>> adapter.match('/news/3')
+('page', {'page': 'news/3'})
+
+
+不排序时，后添加的动态规则会遮住更后面的静态规则
+>>> m = Map([
+...     Rule('/user/<name>', endpoint='user'),
+...     Rule('/user/me', endpoint='me'),
+... ], sort_rules=False)
+>>> adapter = m.bind('example.org', '/')
+>>> m.remove('user')
+>>> adapter.match('/user/me')
+('me', {})
+>>> m.add(Rule('/<section>/me', endpoint='section'))
+>>> adapter.match('/user/me')
+('me', {})
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
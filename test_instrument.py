@@ -0,0 +1,72 @@
+""" 测试运行统计
+
+>>> from url_router.map import Map, MapAdapter
+>>> from url_router.rule import Rule
+>>> from url_router.instrument import Instrumentation
+>>> events = []
+>>> stats = Instrumentation(sink=lambda *event: events.append(event[:3]),
+...                         attempt_sample=1)
+>>> m = Map([
+...     Rule('/', endpoint='index'),
+...     Rule('/bar/', endpoint='bar'),
+...     Rule('/user/<int:id>', endpoint='user', methods=['GET']),
+...     Rule('/<name>', endpoint='page'),
+... ], instrumentation=stats)
+>>> adapter = m.bind('example.org', '/')
+
+
+没有统计的 map 返回普通的 MapAdapter
+>>> type(Map().bind('example.org')) is MapAdapter
+True
+
+
+统计匹配和构建的结果，sink 收到每一次操作
+>>> adapter.match('/user/42')
+('user', {'id': 42})
+>>> for path, method in ('/bar', 'GET'), ('/a/b', 'GET'), ('/user/1', 'POST'):
+...     try:
+...         adapter.match(path, method)
+...     except Exception as e:
+...         print(type(e).__name__)
+RequestRedirect
+NotFound
+MethodNotAllowed
+>>> adapter.build('user', {'id': 7})
+'/user/7'
+>>> adapter.build('user')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.BuildError: ('user', {})
+>>> events  # doctest: +NORMALIZE_WHITESPACE
+[('match', 'user', 'hit'), ('match', None, 'redirect'),
+ ('match', None, 'not_found'), ('match', None, 'method_not_allowed'),
+ ('build', 'user', 'hit'), ('build', 'user', 'error')]
+
+
+快照
+>>> snapshot = stats.snapshot()
+>>> sorted(snapshot)
+['attempts', 'build', 'endpoints', 'match']
+>>> [(outcome, snapshot['match'][outcome]) for outcome in
+...  ('hit', 'redirect', 'not_found', 'method_not_allowed')]
+[('hit', 1), ('redirect', 1), ('not_found', 1), ('method_not_allowed', 1)]
+>>> snapshot['match']['latency_us']['count'], snapshot['build']['error']
+(4, 1)
+>>> snapshot['endpoints']
+{'user': {'hits': 1, 'builds': 1, 'build_errors': 1}}
+
+
+每次匹配尝试的规则数，静态规则查哈希表
+>>> snapshot['attempts']['count'], snapshot['attempts']['total']
+(4, 12)
+>>> stats.reset()
+>>> adapter.match('/')
+('index', {})
+>>> stats.snapshot()['attempts']['total']
+1
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
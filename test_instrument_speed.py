@@ -0,0 +1,30 @@
+import timeit
+from url_router.map import Map
+from url_router.instrument import Instrumentation
+from url_router.bench import TABLES
+
+
+def bench(instrumentation, number=20000):
+    rules, probes = TABLES['params'](1000)
+    m = Map(rules, engine='trie', instrumentation=instrumentation)
+    adapter = m.bind('example.org', '/')
+    path = probes['match'][1]
+    endpoint, values = probes['build']
+    adapter.match(path)
+    result = {}
+    for name, func in ('match', lambda: adapter.match(path)), \
+            ('build', lambda: adapter.build(endpoint, values)):
+        result[name] = min(timeit.repeat(func, number=number, repeat=3)) \
+            / number * 1e6
+    return result
+
+
+if __name__ == "__main__":
+    for name, instrumentation in (
+            ('off', None),
+            ('on', Instrumentation(attempt_sample=0)),
+            ('on, sampled attempts', Instrumentation()),
+            ('on, sink', Instrumentation(sink=lambda *event: None))):
+        print('%-22s %s' % (name, '  '.join(
+            '%s: %.2fus' % item for item in sorted(bench(instrumentation).items())
+        )))
@@ -0,0 +1,53 @@
+""" 测试延迟编译正则式
+
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> def make_map(engine):
+...     return Map([
+...         Rule('/', endpoint='index'),
+...         Rule('/user/<int:id>', endpoint='user'),
+...         Rule('/admin/<name>/', endpoint='admin'),
+...         Rule('/legacy/<path:rest>', endpoint='legacy', build_only=True),
+...     ], engine=engine, lazy=True)
+
+
+添加规则时只保存正则式的源码，第一次匹配到该规则时才编译，
+静态规则查哈希表，不需要正则式
+>>> m = make_map('linear')
+>>> adapter = m.bind('example.org', '/')
+>>> adapter.match('/')
+('index', {})
+>>> [(rule.endpoint, rule._regex is not None) for rule in m.iter_rules()]
+[('index', False), ('legacy', False), ('admin', False), ('user', False)]
+>>> adapter.match('/admin/root/')
+('admin', {'name': 'root'})
+>>> [(rule.endpoint, rule._regex is not None) for rule in m.iter_rules()]
+[('index', True), ('legacy', False), ('admin', True), ('user', False)]
+>>> adapter.build('legacy', {'rest': 'a/b'})
+'/legacy/a/b'
+
+
+regex 引擎的分块也在第一次用到时编译
+>>> m = make_map('regex')
+>>> engine = m.update().matcher.matcher._matchers['']
+>>> [chunk[0] for chunk in engine._chunks]
+[None]
+>>> m.bind('example.org', '/').match('/admin/root')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.RequestRedirect: http://example.org/admin/root/
+>>> [chunk[0] is not None for chunk in engine._chunks]
+[True]
+
+
+warm_up 编译剩下的正则式，也可以在后台线程里运行
+>>> m = make_map('trie')
+>>> m.warm_up(background=True).join()
+>>> [(rule.endpoint, rule._regex is not None) for rule in m.iter_rules()]
+[('index', True), ('legacy', False), ('admin', True), ('user', True)]
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
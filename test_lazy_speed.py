@@ -0,0 +1,35 @@
+import timeit
+from url_router.map import Map
+from url_router.matcher import MATCHERS
+from url_router.bench import TABLES
+
+
+def first_request(table, count, engine, lazy):
+    """新建 map 到第一个请求返回的时间，以及之后单次匹配的时间"""
+    rules, probes = TABLES[table](count)
+    subdomain, path = probes['match']
+    start = timeit.default_timer()
+    m = Map(rules, engine=engine, lazy=lazy)
+    adapter = m.bind('example.org', '/', subdomain)
+    adapter.match(path)
+    first = timeit.default_timer() - start
+    # 前面的规则很少用到时，第一个请求只编译用到的部分
+    start = timeit.default_timer()
+    m.warm_up()
+    warm_up = timeit.default_timer() - start
+    number = 1000
+    match = timeit.timeit(lambda: adapter.match(path), number=number) / number
+    return first, warm_up, match
+
+
+if __name__ == "__main__":
+    count = 10000
+    for table in 'params', 'deep':
+        for engine in sorted(MATCHERS):
+            for lazy in False, True:
+                first, warm_up, match = first_request(table, count, engine,
+                                                      lazy)
+                print('%-6s %d rules %-6s %-5s first request: %8.1fms  '
+                      'warm up: %8.1fms  match: %.2fus' % (
+                          table, count, engine, lazy and 'lazy' or 'eager',
+                          first * 1e3, warm_up * 1e3, match * 1e6))
@@ -82,6 +82,83 @@ url_router.exceptions.NotFound
 Traceback (most recent call last):
     ...
 url_router.exceptions.RequestRedirect: http://example.org/bar/
+
+
+测试请求方法
+>>> m = Map([
+...     Rule('/edit', endpoint='edit', methods=['GET']),
+...     Rule('/edit', endpoint='save', methods=['POST', 'PUT']),
+... ])
+>>> adapter = m.bind('example.org', '/')
+>>> adapter.match('/edit', 'post')
+('save', {})
+>>> adapter.match('/edit', 'DELETE')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.MethodNotAllowed: ['GET', 'POST', 'PUT']
+
+
+测试规则排序：具体的规则先匹配，贪婪的规则最后匹配
+>>> m = Map([
+...     Rule('/<path:page>', endpoint='page'),
+...     Rule('/user/<name>', endpoint='user'),
+...     Rule('/user/<int:id>', endpoint='user_id'),
+...     Rule('/user/me', endpoint='me'),
+... ])
+>>> adapter = m.bind('example.org', '/')
+>>> adapter.match('/user/me')
+('me', {})
+>>> adapter.match('/user/1')
+('user_id', {'id': 1})
+>>> adapter.match('/user/bob')
+('user', {'name': 'bob'})
+>>> adapter.match('/about/team')
+('page', {'page': 'about/team'})
+
+
+iter_rules 总是按匹配顺序，和是否已经匹配过无关
+>>> fresh = Map([Rule('/<path:page>', endpoint='page'),
+...              Rule('/about', endpoint='about')])
+>>> [rule.endpoint for rule in fresh.iter_rules()]
+['about', 'page']
+
+
+静态部分多的规则先匹配，贪婪只在静态部分相同时才排在后面
+>>> assets = Map([
+...     Rule('/<lang>/<page>', endpoint='page'),
+...     Rule('/static/<path:p>', endpoint='static'),
+...     Rule('/files/<path:p>', endpoint='files'),
+...     Rule('/<a>/<b>', endpoint='ab'),
+... ]).bind('example.org', '/')
+>>> assets.match('/static/app.js')
+('static', {'p': 'app.js'})
+>>> assets.match('/files/a.txt')
+('files', {'p': 'a.txt'})
+>>> assets.match('/en/about')
+('page', {'lang': 'en', 'page': 'about'})
+
+
+按命中次数调整顺序，只越过不可能匹配同一路径的规则，结果不变
+>>> m.add(Rule('/blog/<int:id>', endpoint='blog'))
+>>> m.profile_order({'blog': 100, 'user': 10})
+>>> adapter.match('/user/bob')
+('user', {'name': 'bob'})
+>>> [rule.endpoint for rule in m.iter_rules()]
+['blog', 'me', 'user_id', 'user', 'page']
+
+
+能匹配斜杠的转换器不按段数判断，规则不移动
+>>> from url_router.converters import BaseConverter
+>>> class PairConverter(BaseConverter):
+...     regex = r'[^/]+/[^/]+'
+...
+>>> m = Map([
+...     Rule('/repo/<pair:name>', endpoint='repo'),
+...     Rule('/repo/<a>/<b>', endpoint='ab'),
+... ], converters={'pair': PairConverter}, sort_rules=False)
+>>> m.profile_order({'ab': 100})
+>>> m.bind('example.org', '/').match('/repo/a/b')
+('repo', {'name': 'a/b'})
 """
 
 
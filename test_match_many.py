@@ -0,0 +1,24 @@
+""" 测试批量匹配
+
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> m = Map([
+...     Rule('/', endpoint='index'),
+...     Rule('/bar/', endpoint='bar'),
+...     Rule('/integer/<int:name>', endpoint='integer'),
+... ])
+>>> adapter = m.bind('example.org', '/')
+
+
+>>> for result in adapter.match_many(['/', '/integer/1', '/bar', '/missing']):
+...     print(repr(result))
+('index', {})
+('integer', {'name': 1})
+RequestRedirect('http://example.org/bar/')
+NotFound()
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
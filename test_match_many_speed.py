@@ -0,0 +1,35 @@
+import timeit
+from test_engine_speed import make_rules
+from url_router.map import Map
+from url_router.exceptions import NotFound, RequestRedirect
+
+
+def match_loop(adapter, paths):
+    """逐个调用 match"""
+    results = []
+    for path in paths:
+        try:
+            results.append(adapter.match(path))
+        except (NotFound, RequestRedirect) as e:
+            results.append(e)
+    return results
+
+
+def match_batch(adapter, paths):
+    """调用 match_many"""
+    return list(adapter.match_many(paths))
+
+
+if __name__ == "__main__":
+    count = 1000
+    paths = []
+    for i in range(count // 2):
+        paths.append('/static%d/page' % i)
+        paths.append('/dynamic%d/%d' % (i, i))
+        paths.append('/missing%d' % i)
+    for engine in ('linear', 'trie'):
+        adapter = Map(make_rules(count), engine=engine).bind('example.org')
+        for func in (match_loop, match_batch):
+            seconds = timeit.timeit(lambda: func(adapter, paths), number=3) / 3
+            print('%-6s %-12s %.2fus/path' % (
+                engine, func.__name__, seconds / len(paths) * 1e6))
@@ -0,0 +1,46 @@
+""" 测试规则的匹配计划
+
+>>> import pickle
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> from url_router.converters import BaseConverter
+>>> class VersionConverter(BaseConverter):
+...     regex = r'v(\\d+)\\.(\\d+)'
+...     def to_python(self, value):
+...         return tuple(int(part) for part in value[1:].split('.'))
+...
+>>> def make_map(engine):
+...     return Map([
+...         Rule('/<version:v>/<name>/<int:id>', endpoint='item'),
+...         Rule('/<version:v>/<name>/', endpoint='folder'),
+...     ], converters={'version': VersionConverter}, engine=engine)
+
+
+按位置读取参数，转换器正则式里的分组也算在内；恒等转换器不调用 to_python
+>>> rule = make_map('linear').update().rules[0]
+>>> [(name, index, to_python is None) for name, index, to_python in rule._match_plan]
+[('v', 0, False), ('name', 3, True), ('id', 4, False)]
+>>> for engine in 'linear', 'trie', 'regex':
+...     adapter = make_map(engine).bind('example.org')
+...     print(engine, adapter.match('/v1.2/docs/7'), adapter.match('/v3.0/docs/'))
+...
+linear ('item', {'v': (1, 2), 'name': 'docs', 'id': 7}) ('folder', {'v': (3, 0), 'name': 'docs'})
+trie ('item', {'v': (1, 2), 'name': 'docs', 'id': 7}) ('folder', {'v': (3, 0), 'name': 'docs'})
+regex ('item', {'v': (1, 2), 'name': 'docs', 'id': 7}) ('folder', {'v': (3, 0), 'name': 'docs'})
+>>> make_map('regex').bind('example.org').match('/v3.0/docs')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.RequestRedirect: http://example.org/v3.0/docs/
+
+
+反序列化后重新编译匹配计划
+>>> m = Map([Rule('/<name>/<int:id>/', endpoint='folder')])
+>>> copy = pickle.loads(pickle.dumps(m.update().rules[0]))
+>>> copy._suffix_group, copy.match('|/docs/7/')
+(3, {'name': 'docs', 'id': 7})
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,40 @@
+import gc
+import tracemalloc
+from url_router.map import Map
+from url_router.rule import Rule
+
+
+def make_rules(count):
+    """生成 count 条多租户风格的规则"""
+    rules = []
+    for i in range(count // 4):
+        tenant = 'tenant%d' % i
+        rules.append(Rule('/%s/' % tenant, endpoint='%s.index' % tenant))
+        rules.append(Rule('/%s/user/<int:id>' % tenant,
+                          endpoint='%s.user' % tenant, methods=['GET']))
+        rules.append(Rule('/%s/post/<int(fixed_digits=4):year>/<slug>'
+                          % tenant, endpoint='%s.post' % tenant))
+        rules.append(Rule('/%s/static/<path:filename>' % tenant,
+                          endpoint='%s.static' % tenant,
+                          methods=['GET', 'HEAD']))
+    return rules
+
+
+def bytes_per_rule(count, engine):
+    """构建 map 并编译匹配器后，每条规则占用的字节数"""
+    gc.collect()
+    tracemalloc.start()
+    m = Map(make_rules(count), engine=engine)
+    m.update()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del m
+    return size / count
+
+
+if __name__ == "__main__":
+    for count in (1000, 10000):
+        for engine in ('linear', 'trie'):
+            print('%6d rules %-7s %8.0f bytes/rule' % (
+                count, engine, bytes_per_rule(count, engine)))
@@ -0,0 +1,45 @@
+""" 测试合并正则匹配引擎
+
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> m = Map([
+...     Rule('/', endpoint='index'),
+...     Rule('/bar/', endpoint='bar'),
+...     Rule('/any/<name>', endpoint='any'),
+...     Rule('/page/<int(min=1):page>', endpoint='page'),
+...     Rule('/page/<name>', endpoint='page_name'),
+...     Rule('/files/<path:file>', endpoint='files'),
+... ], engine='regex')
+>>> adapter = m.bind('example.org', '/')
+
+
+>>> adapter.match('/')
+('index', {})
+>>> adapter.match('/any/data')
+('any', {'name': 'data'})
+>>> adapter.match('/files/a/b.txt')
+('files', {'file': 'a/b.txt'})
+
+
+转换器验证失败时继续尝试后面的规则
+>>> adapter.match('/page/3')
+('page', {'page': 3})
+>>> adapter.match('/page/0')
+('page_name', {'name': '0'})
+
+
+测试斜杠
+>>> adapter.match('/bar')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.RequestRedirect: http://example.org/bar/
+>>> adapter.match('/missing')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.NotFound
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,33 @@
+""" 测试访问日志回放
+
+>>> import pickle
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> from url_router.replay import parse_line
+>>> parse_line('127.0.0.1 - - [10/Oct/2000:13:55:36 -0700] "GET /a%20b?x=1 HTTP/1.0" 200 2326')
+('GET', '/a b')
+>>> parse_line('POST /user/1')
+('POST', '/user/1')
+>>> parse_line('/')
+('GET', '/')
+
+
+Map 可以序列化，反序列化时不再解析规则
+>>> m = Map([
+...     Rule('/', endpoint='index'),
+...     Rule('/integer/<int:name>', endpoint='integer'),
+... ], engine='trie')
+>>> m.bind('example.org').match('/integer/1')
+('integer', {'name': 1})
+>>> m2 = pickle.loads(pickle.dumps(m))
+>>> adapter = m2.bind('example.org')
+>>> adapter.match('/integer/2')
+('integer', {'name': 2})
+>>> adapter.build('integer', {'name': 3})
+'/integer/3'
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,51 @@
+import timeit
+from url_router.map import Map
+from url_router.rule import Rule
+from url_router.exceptions import ValidationError, RequestSlash
+
+
+def groupdict_match(rule, path):
+    """以前的 Rule.match：构造 groupdict，按名字查找转换器"""
+    m = rule.get_regex().search(path)
+    if m is None:
+        return None
+    groups = m.groupdict()
+    if rule.strict_slashes and not rule.is_leaf and \
+            not groups.pop('__suffix__'):
+        raise RequestSlash()
+    elif not rule.strict_slashes:
+        del groups['__suffix__']
+    result = {}
+    for name, value in groups.items():
+        try:
+            value = rule._converters[name].to_python(value)
+        except ValidationError:
+            return
+        result[str(name)] = value
+    return result
+
+
+RULES = {
+    'one string': ('/user/<name>', '|/user/alice'),
+    'one int': ('/item/<int:id>', '|/item/42'),
+    'four strings': ('/<a>/<b>/<c>/<d>', '|/w/x/y/z'),
+    'mixed six': ('/<lang>/<int:year>/<int:month>/<slug>/<path:rest>/<int:n>',
+                  '|/en/2024/05/hello/a/b/c/7'),
+    'folder': ('/<org>/<repo>/<branch>/', '|/acme/site/main/'),
+}
+
+
+if __name__ == "__main__":
+    number = 200000
+    m = Map([Rule(string, endpoint=name)
+             for name, (string, path) in RULES.items()])
+    rules = dict([(rule.endpoint, rule) for rule in m.iter_rules()])
+    for name, (string, path) in sorted(RULES.items()):
+        rule = rules[name]
+        assert rule.match(path) == groupdict_match(rule, path)
+        before = timeit.timeit(lambda: groupdict_match(rule, path),
+                               number=number) / number * 1e6
+        after = timeit.timeit(lambda: rule.match(path),
+                              number=number) / number * 1e6
+        print('%-14s groupdict: %.3fus  plan: %.3fus  (%.2fx)' % (
+            name, before, after, before / after))
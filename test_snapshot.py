@@ -0,0 +1,87 @@
+""" 测试 Map.dump 和 Map.load
+
+>>> import os, pickle, tempfile
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> def make_rules():
+...     return [
+...         Rule('/', endpoint='index'),
+...         Rule('/bar/', endpoint='bar'),
+...         Rule('/user/<int:id>', endpoint='user', methods=['GET']),
+...     ]
+>>> filename = os.path.join(tempfile.mkdtemp(), 'routes.snapshot')
+>>> Map(make_rules(), engine='trie').dump(filename)
+
+
+加载后可以直接匹配和构建
+>>> m = Map.load(filename, make_rules(), engine='trie')
+>>> adapter = m.bind('example.org', '/')
+>>> adapter.match('/user/42')
+('user', {'id': 42})
+>>> adapter.match('/bar')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.RequestRedirect: http://example.org/bar/
+>>> adapter.build('user', {'id': 7})
+'/user/7'
+
+
+规则或参数不同时抛出 ValueError
+>>> Map.load(filename, make_rules()[:2], engine='trie')  # doctest: +ELLIPSIS
+Traceback (most recent call last):
+    ...
+ValueError: map snapshot ... does not match the rules
+>>> Map.load(filename, make_rules(), engine='linear')  # doctest: +ELLIPSIS
+Traceback (most recent call last):
+    ...
+ValueError: map snapshot ... does not match the rules
+
+
+lazy 和 instrumentation 用在加载的 map 上，不参与哈希
+>>> from url_router.instrument import Instrumentation
+>>> stats = Instrumentation()
+>>> m = Map.load(filename, make_rules(), engine='trie', lazy=False,
+...              instrumentation=stats)
+>>> m.instrumentation is stats, m.lazy
+(True, False)
+>>> [rule._regex is not None for rule in m.iter_rules()]
+[True, True, True]
+>>> m.bind('example.org', '/').match('/user/42')
+('user', {'id': 42})
+>>> stats.snapshot()['match']['hit']
+1
+>>> Map.load(filename).instrumentation is None
+True
+
+
+dump 先写临时文件再改名，目录里不留下临时文件；截断的快照抛出 ValueError
+>>> Map(make_rules(), engine='trie').dump(filename)
+>>> os.listdir(os.path.dirname(filename))
+['routes.snapshot']
+>>> with open(filename, 'rb') as f:
+...     data = f.read()
+>>> for size in 0, 40, len(data) // 2:
+...     with open(filename, 'wb') as f:
+...         _ = f.write(data[:size])
+...     try:
+...         Map.load(filename, make_rules(), engine='trie')
+...     except ValueError as e:
+...         print(str(e).split(':')[0].startswith('cannot read map snapshot'))
+True
+True
+True
+
+
+不认识的格式版本
+>>> with open(filename, 'wb') as f:
+...     pickle.dump({'version': 0}, f)
+>>> Map.load(filename)  # doctest: +ELLIPSIS
+Traceback (most recent call last):
+    ...
+ValueError: unsupported map snapshot ...
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
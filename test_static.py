@@ -0,0 +1,55 @@
+""" 测试静态路由哈希表
+
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> m = Map([
+...     Rule('/', endpoint='index'),
+...     Rule('/user/<name>', endpoint='user'),
+...     Rule('/user/me', endpoint='me'),
+...     Rule('/about', endpoint='about', methods=['GET']),
+...     Rule('/about', endpoint='about_post'),
+...     Rule('/bar/', endpoint='bar'),
+... ], sort_rules=False)
+>>> adapter = m.bind('example.org', '/')
+
+
+>>> adapter.match('/')
+('index', {})
+>>> adapter.match('/about')
+('about', {})
+>>> adapter.match('/about', 'POST')
+('about_post', {})
+
+
+被前面的动态规则遮住的静态规则
+>>> adapter.match('/user/me')
+('user', {'name': 'me'})
+
+
+能匹配斜杠的转换器遮住的不止一段路径
+>>> from url_router.converters import BaseConverter
+>>> class PairConverter(BaseConverter):
+...     regex = r'[^/]+/[^/]+'
+...
+>>> pairs = Map([
+...     Rule('/repo/<pair:name>', endpoint='repo'),
+...     Rule('/repo/a/b', endpoint='static'),
+... ], converters={'pair': PairConverter}, sort_rules=False)
+>>> pairs.bind('example.org', '/').match('/repo/a/b')
+('repo', {'name': 'a/b'})
+>>> pairs.add(Rule('/repo/c/d', endpoint='added'))
+>>> pairs.bind('example.org', '/').match('/repo/c/d')
+('repo', {'name': 'c/d'})
+
+
+测试斜杠
+>>> adapter.match('/bar')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.RequestRedirect: http://example.org/bar/
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
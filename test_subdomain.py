@@ -0,0 +1,49 @@
+""" 测试按子域名分区匹配
+
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> m = Map([
+...     Rule('/', subdomain='<tenant>', endpoint='home'),
+...     Rule('/', subdomain='a', endpoint='a.index'),
+...     Rule('/<int:id>', subdomain='a', endpoint='a.item'),
+...     Rule('/<int:id>', subdomain='<tenant>', endpoint='item'),
+...     Rule('/about', subdomain='b', endpoint='b.about'),
+... ], engine='regex')
+
+
+每个子域名只有自己的规则和动态子域名的规则
+>>> engine = m.update().matcher.matcher
+>>> sorted(engine._matchers)
+['a', 'b']
+>>> [rule.endpoint for rule in engine._matchers['b'].rules]
+['b.about', 'item', 'home']
+>>> [rule.endpoint for rule in engine._wildcard.rules]
+['item', 'home']
+
+>>> m.bind('example.org', subdomain='a').match('/1')
+('a.item', {'id': 1})
+>>> m.bind('example.org', subdomain='b').match('/1')
+('item', {'tenant': 'b', 'id': 1})
+>>> m.bind('example.org', subdomain='c').match('/')
+('home', {'tenant': 'c'})
+
+
+增删规则只更新受影响的分区
+>>> m.add(Rule('/about', subdomain='c', endpoint='c.about'))
+>>> m.remove('b.about')
+>>> engine = m.update().matcher.matcher
+>>> sorted(engine._matchers)
+['a', 'c']
+>>> m.remove('item')
+>>> [rule.endpoint for rule in m.update().matcher.matcher._matchers['a'].rules]
+['a.index', 'a.item', 'home']
+>>> m.bind('example.org', subdomain='b').match('/1')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.NotFound
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
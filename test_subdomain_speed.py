@@ -0,0 +1,49 @@
+import timeit
+from url_router.map import Map
+from url_router.rule import Rule
+from url_router.matcher import MATCHERS
+
+
+def make_rules(tenants):
+    """每个租户一个子域名，各有四条规则，另外有两条动态子域名的规则"""
+    rules = [
+        Rule('/', subdomain='<tenant>', endpoint='home'),
+        Rule('/health', subdomain='<tenant>', endpoint='health'),
+    ]
+    for i in range(tenants):
+        tenant = 'tenant%d' % i
+        rules.append(Rule('/', subdomain=tenant, endpoint='%s.index' % tenant))
+        rules.append(Rule('/user/<int:id>', subdomain=tenant,
+                          endpoint='%s.user' % tenant))
+        rules.append(Rule('/post/<slug>', subdomain=tenant,
+                          endpoint='%s.post' % tenant))
+        rules.append(Rule('/static/<path:filename>', subdomain=tenant,
+                          endpoint='%s.static' % tenant))
+    return rules
+
+
+def bench(engine, tenants, number=1000):
+    m = Map(make_rules(tenants), engine=engine)
+    m.update()  # 不计入编译时间
+    last = m.bind('example.org', subdomain='tenant%d' % (tenants - 1))
+    other = m.bind('example.org', subdomain='unknown')
+    stmts = {
+        'user': (last.match, '/user/42'),
+        'static': (last.match, '/static/css/site.css'),
+        'wildcard': (other.match, '/health'),
+    }
+    result = {}
+    for name, (match, path) in stmts.items():
+        result[name] = timeit.timeit(lambda: match(path), number=number)
+    return result
+
+
+if __name__ == "__main__":
+    for tenants in (10, 100, 500, 2000):
+        for engine in sorted(MATCHERS):
+            number = 10000
+            result = bench(engine, tenants, number)
+            print('%5d tenants %-7s %s' % (tenants, engine, '  '.join(
+                '%s: %.2fus' % (name, seconds / number * 1e6)
+                for name, seconds in sorted(result.items())
+            )))
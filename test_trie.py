@@ -0,0 +1,106 @@
+""" 测试trie匹配引擎
+
+>>> from url_router.map import Map
+>>> from url_router.rule import Rule
+>>> m = Map([
+...     Rule('/', endpoint='index'),
+...     Rule('/foo', endpoint='foo'),
+...     Rule('/bar/', endpoint='bar'),
+...     Rule('/any/<name>', endpoint='any'),
+...     Rule('/integer/<int:name>', endpoint='integer'),
+...     Rule('/float/<float:name>', endpoint='float'),
+...     Rule('/page/<int(min=1):page>', endpoint='page'),
+...     Rule('/page/<name>', endpoint='page_name'),
+...     Rule('/files/<path:file>', endpoint='files'),
+...     Rule('/post', methods=['POST'], endpoint='post'),
+... ], engine='trie')
+>>> adapter = m.bind('example.org', '/')
+
+
+>>> adapter.match('/')
+('index', {})
+>>> adapter.match('/foo')
+('foo', {})
+>>> adapter.match('/bar/')
+('bar', {})
+>>> adapter.match('/any/data')
+('any', {'name': 'data'})
+>>> adapter.match('/integer/1')
+('integer', {'name': 1})
+>>> adapter.match('/float/3.14')
+('float', {'name': 3.14})
+
+
+转换器验证失败时继续尝试后面的规则
+>>> adapter.match('/page/3')
+('page', {'page': 3})
+>>> adapter.match('/page/0')
+('page_name', {'name': '0'})
+
+
+贪婪的转换器退回到正则匹配
+>>> adapter.match('/files/a/b.txt')
+('files', {'file': 'a/b.txt'})
+
+
+正则式可能匹配斜杠的转换器也退回到正则匹配
+>>> from url_router.converters import BaseConverter, regex_matches_slash
+>>> class PairConverter(BaseConverter):
+...     regex = r'[^/]+/[^/]+'
+...
+>>> regex_matches_slash(PairConverter.regex), regex_matches_slash(r'[^/]+')
+(True, False)
+>>> pairs = Map([Rule('/repo/<pair:name>', endpoint='repo'),
+...              Rule('/repo/<a>/<b>', endpoint='ab')],
+...             converters={'pair': PairConverter}, sort_rules=False,
+...             engine='trie')
+>>> pairs.bind('example.org', '/').match('/repo/a/b')
+('repo', {'name': 'a/b'})
+
+
+能匹配空段的转换器也退回到正则匹配，空段不能紧跟在斜杠后面
+>>> empty = Map([Rule('/<string(minlength=0):z>/', endpoint='e')],
+...             engine='trie').bind('example.org', '/')
+>>> empty.match('/')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.NotFound
+>>> empty.match('/x/')
+('e', {'z': 'x'})
+>>> empty = Map([Rule('/a/<string(minlength=0):z>', endpoint='a',
+...                   strict_slashes=False)],
+...             engine='trie').bind('example.org', '/')
+>>> empty.match('/a/')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.NotFound
+
+
+测试方法
+>>> adapter.match('/post', 'POST')
+('post', {})
+>>> adapter.match('/post')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.MethodNotAllowed: ['POST']
+
+
+测试斜杠
+>>> adapter.match('/foo/')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.NotFound
+>>> adapter.match('/bar')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.RequestRedirect: http://example.org/bar/
+>>> adapter.match('/missing')
+Traceback (most recent call last):
+    ...
+url_router.exceptions.NotFound
+"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
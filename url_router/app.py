@@ -0,0 +1,207 @@
+"""
+WSGI 和 ASGI 应用
+
+Wrap a :class:`Map` and a dict of view functions into an application::
+
+    def user(environ, start_response, args):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'user %d' % args['id']]
+
+    app = WSGIApp(Map([Rule('/user/<int:id>', endpoint='user')]),
+                  {'user': user})
+
+WSGI views are called as ``view(environ, start_response, args)`` and ASGI
+views as ``await view(scope, receive, send, args)``.  The adapter of the
+request is stored as ``'url_router.adapter'`` in the environ or the scope,
+for building URLs.  :class:`NotFound`, :class:`MethodNotAllowed` and
+:class:`RequestRedirect` become ``404``, ``405`` and ``308`` responses.
+
+Binding a map for every request recomputes the server name and the
+subdomain, so the applications keep their adapters in an LRU cache keyed
+on ``(host, script_name, url_scheme)``.  The subdomain follows from the
+host and is only split off when an adapter is created.
+"""
+
+from .exceptions import NotFound, MethodNotAllowed, RequestRedirect
+from .utils import LRUCache, split_subdomain
+
+
+# 每个应用缓存的 MapAdapter 数量，Host 头由客户端决定，所以要有上限
+ADAPTER_CACHE_SIZE = 256
+
+# 没有端口的 Host 对应的默认端口
+_default_ports = {'http': 80, 'https': 443, 'ws': 80, 'wss': 443}
+
+_missing = object()
+
+
+def error_response(e, query_string=''):
+    """
+    Turn a routing exception into ``(status, headers, body)``.  The query
+    string is kept on redirects.
+    """
+    if isinstance(e, RequestRedirect):
+        location = e.args[0]
+        if query_string:
+            location += '?' + query_string
+        status, headers, body = '308 Permanent Redirect', [
+            ('Location', location)], b''
+    elif isinstance(e, MethodNotAllowed):
+        status, headers, body = '405 Method Not Allowed', [
+            ('Allow', ', '.join(e.valid_methods or ()))
+        ], b'Method Not Allowed'
+    else:
+        status, headers, body = '404 Not Found', [], b'Not Found'
+    headers.append(('Content-Type', 'text/plain; charset=utf-8'))
+    headers.append(('Content-Length', str(len(body))))
+    return status, headers, body
+
+
+class BaseApp(object):
+    """
+    The view registry and the adapter cache of :class:`WSGIApp` and
+    :class:`ASGIApp`.
+
+    `views` maps endpoints to view functions, :meth:`view` adds more.  If
+    `server_name` is given the subdomain is taken from the host of the
+    request and other hosts get a ``404``.  Otherwise the host of the
+    request is the server name and the default subdomain of the map is
+    used.
+    """
+
+    def __init__(self, map, views=None, server_name=None,
+                 adapter_cache_size=ADAPTER_CACHE_SIZE):
+        self.map = map
+        self.views = dict(views or ())
+        self.server_name = server_name
+        self._adapters = LRUCache(adapter_cache_size)
+
+    def view(self, endpoint):
+        """A decorator that registers the view function of an endpoint."""
+        def decorator(f):
+            self.views[endpoint] = f
+            return f
+        return decorator
+
+    def get_view(self, endpoint):
+        """Return the view of an endpoint, raises `LookupError` if missing."""
+        try:
+            return self.views[endpoint]
+        except KeyError:
+            raise LookupError('no view for the endpoint %r' % endpoint)
+
+    def get_adapter(self, host, script_name, url_scheme):
+        """
+        Return the cached :class:`MapAdapter` of a request, or `None` if the
+        host does not belong to `server_name`.
+        """
+        key = (host, script_name, url_scheme)
+        adapter = self._adapters.get(key, _missing)
+        if adapter is _missing:
+            if self.server_name is None:
+                adapter = self.map.bind(host, script_name, None, url_scheme)
+            else:
+                subdomain = split_subdomain(host, self.server_name)
+                if subdomain is not None:
+                    adapter = self.map.bind(self.server_name, script_name,
+                                            subdomain, url_scheme)
+                else:
+                    adapter = None
+            self._adapters.set(key, adapter)
+        return adapter
+
+
+class WSGIApp(BaseApp):
+    """A WSGI application that routes requests to the views of a map."""
+
+    def __call__(self, environ, start_response):
+        url_scheme = environ['wsgi.url_scheme']
+        host = environ.get('HTTP_HOST')
+        if not host:
+            host = environ['SERVER_NAME']
+            if (url_scheme, environ['SERVER_PORT']) not in \
+                    (('https', '443'), ('http', '80')):
+                host += ':' + environ['SERVER_PORT']
+        adapter = self.get_adapter(host, environ.get('SCRIPT_NAME') or '/',
+                                   url_scheme)
+        # PEP 3333 的 PATH_INFO 是按 latin-1 解码的字节
+        path_info = environ.get('PATH_INFO') or '/'
+        path_info = path_info.encode('latin-1').decode(self.map.charset,
+                                                       'replace')
+        try:
+            if adapter is None:
+                raise NotFound()
+            endpoint, args = adapter.match(path_info,
+                                           environ['REQUEST_METHOD'])
+        except (NotFound, MethodNotAllowed, RequestRedirect) as e:
+            status, headers, body = error_response(
+                e, environ.get('QUERY_STRING'))
+            start_response(status, headers)
+            return [body]
+        environ['url_router.adapter'] = adapter
+        return self.get_view(endpoint)(environ, start_response, args)
+
+
+class ASGIApp(BaseApp):
+    """
+    An ASGI application that routes HTTP and websocket connections to
+    the coroutine views of a map.  Matching uses
+    :meth:`MapAdapter.match_async`, so the ``to_python_async`` hooks of
+    the converters are awaited.  The map is compiled on lifespan startup.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        is_websocket = scope['type'] == 'websocket'
+        url_scheme = scope.get('scheme') or (is_websocket and 'ws' or 'http')
+        host = None
+        for name, value in scope.get('headers') or ():
+            if name == b'host':
+                host = value.decode('latin-1')
+                break
+        if not host:
+            host, port = scope.get('server') or (self.server_name or
+                                                 'localhost', None)
+            if port is not None and port != _default_ports.get(url_scheme):
+                host = '%s:%d' % (host, port)
+        root_path = scope.get('root_path') or ''
+        path = scope['path']
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        adapter = self.get_adapter(host, root_path or '/', url_scheme)
+        try:
+            if adapter is None:
+                raise NotFound()
+            endpoint, args = await adapter.match_async(
+                path, scope.get('method') or 'GET')
+        except (NotFound, MethodNotAllowed, RequestRedirect) as e:
+            if is_websocket:
+                await send({'type': 'websocket.close'})
+                return
+            status, headers, body = error_response(
+                e, scope.get('query_string', b'').decode('latin-1'))
+            await send({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'),
+                             value.encode('latin-1'))
+                            for name, value in headers],
+            })
+            await send({'type': 'http.response.body', 'body': body})
+            return
+        scope = dict(scope)
+        scope['url_router.adapter'] = adapter
+        await self.get_view(endpoint)(scope, receive, send, args)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # 第一个请求不用等待编译
+                self.map.update()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
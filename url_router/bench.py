@@ -0,0 +1,319 @@
+"""
+基准测试
+
+Time the map on synthetic route tables of different shapes and sizes and
+print the results as a table or as JSON::
+
+    python -m url_router.bench --sizes 10,1000,50000 --json > before.json
+    python -m url_router.bench --json > after.json
+    python -m url_router.bench --compare before.json after.json
+
+The route tables are ``static`` (no converters), ``params`` (converters
+in every rule), ``deep`` (six segments, converters in the middle) and
+``subdomains`` (four rules per tenant subdomain plus dynamic subdomain
+rules).  Every table is timed with every engine for these cases:
+
+    ``construct``       ``Map(rules)`` plus compiling it, per map
+    ``match``           a path near the end of the table
+    ``match_miss``      a path no rule matches
+    ``redirect``        a path that needs a trailing slash
+    ``build``           building a URL of a rule near the end
+    ``build_query``     the same with extra values for the query string
+    ``bind_to_environ`` binding the map to a WSGI environ
+
+The times are the best of three runs in microseconds per operation.
+``--compare`` prints the cases that got slower than ``--threshold`` and
+exits with status 1 if there are any, to catch regressions between
+commits.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+
+from .exceptions import NotFound, RequestRedirect
+from .map import Map
+from .matcher import MATCHERS
+from .rule import Rule
+
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 50000)
+
+# 每个用例取几次计时的最小值
+REPEAT = 3
+
+# 每次计时至少运行的秒数
+MIN_TIME = 0.02
+
+
+def static_rules(count):
+    """Rules without converters, every other one with a trailing slash."""
+    rules = []
+    for i in range(count):
+        if i % 2:
+            rules.append(Rule('/s%d/dir%d/' % (i // 10, i),
+                              endpoint='dir%d' % i))
+        else:
+            rules.append(Rule('/s%d/page%d' % (i // 10, i),
+                              endpoint='page%d' % i))
+    last = (count - 1) // 2 * 2
+    slash = max(count - 1 - count % 2, 1)
+    return rules, {
+        'match': ('', '/s%d/page%d' % (last // 10, last)),
+        'miss': ('', '/s0/missing'),
+        'redirect': ('', '/s%d/dir%d' % (slash // 10, slash)),
+        'build': ('page%d' % last, {}),
+        'build_query': ('page%d' % last, {'q': 'search term', 'page': 2}),
+    }
+
+
+def param_rules(count):
+    """Rules with one or two converters each."""
+    rules = []
+    for i in range(count):
+        if i % 2:
+            rules.append(Rule('/p%d/<slug>/<int:year>/' % i,
+                              endpoint='post%d' % i))
+        else:
+            rules.append(Rule('/p%d/<int:id>' % i, endpoint='item%d' % i))
+    last = (count - 1) // 2 * 2
+    slash = max(count - 1 - count % 2, 1)
+    return rules, {
+        'match': ('', '/p%d/42' % last),
+        'miss': ('', '/p%d/not-a-number' % last),
+        'redirect': ('', '/p%d/hello/2024' % slash),
+        'build': ('item%d' % last, {'id': 42}),
+        'build_query': ('item%d' % last, {'id': 42, 'q': 'search term',
+                                          'page': 2}),
+    }
+
+
+def deep_rules(count):
+    """Rules six segments deep with converters in the middle."""
+    rules = []
+    for i in range(count):
+        prefix = '/l%d/m%d/n%d' % (i // 1000, i // 100 % 10, i)
+        if i % 2:
+            rules.append(Rule(prefix + '/<int:id>/edit/<slug>/',
+                              endpoint='edit%d' % i))
+        else:
+            rules.append(Rule(prefix + '/<int:id>/view/<slug>',
+                              endpoint='view%d' % i))
+    last = (count - 1) // 2 * 2
+    slash = max(count - 1 - count % 2, 1)
+
+    def path(i, action):
+        return '/l%d/m%d/n%d/7/%s/hello' % (i // 1000, i // 100 % 10, i,
+                                            action)
+    return rules, {
+        'match': ('', path(last, 'view')),
+        'miss': ('', path(last, 'delete')),
+        'redirect': ('', path(slash, 'edit')),
+        'build': ('view%d' % last, {'id': 7, 'slug': 'hello'}),
+        'build_query': ('view%d' % last, {'id': 7, 'slug': 'hello',
+                                          'q': 'search term', 'page': 2}),
+    }
+
+
+def subdomain_rules(count):
+    """Four rules per tenant subdomain and two dynamic subdomain rules."""
+    rules = [
+        Rule('/', subdomain='<tenant>', endpoint='home'),
+        Rule('/health', subdomain='<tenant>', endpoint='health'),
+    ]
+    tenants = max(count // 4, 1)
+    for i in range(tenants):
+        tenant = 't%d' % i
+        rules.append(Rule('/', subdomain=tenant, endpoint=tenant + '.index'))
+        rules.append(Rule('/user/<int:id>', subdomain=tenant,
+                          endpoint=tenant + '.user'))
+        rules.append(Rule('/post/<slug>/', subdomain=tenant,
+                          endpoint=tenant + '.post'))
+        rules.append(Rule('/static/<path:filename>', subdomain=tenant,
+                          endpoint=tenant + '.static'))
+    last = 't%d' % (tenants - 1)
+    return rules, {
+        'match': (last, '/user/42'),
+        'miss': (last, '/missing'),
+        'redirect': (last, '/post/hello'),
+        'build': (last + '.user', {'id': 42}),
+        'build_query': (last + '.user', {'id': 42, 'q': 'search term',
+                                         'page': 2}),
+    }
+
+
+TABLES = {
+    'static':       static_rules,
+    'params':       param_rules,
+    'deep':         deep_rules,
+    'subdomains':   subdomain_rules,
+}
+
+
+def measure(func, number=None, min_time=MIN_TIME):
+    """
+    Best time of `func` in microseconds per call.  Without `number` the
+    calls per run are doubled until a run takes `min_time` seconds.
+    """
+    timer = timeit.Timer(func)
+    if number is None:
+        number = 1
+        while timer.timeit(number) < min_time:
+            number *= 2
+    return min(timer.repeat(REPEAT, number)) / number * 1e6
+
+
+def _expect(func, exception):
+    def run():
+        try:
+            func()
+        except exception:
+            pass
+    return run
+
+
+def bench_table(table, count, engine, min_time=MIN_TIME):
+    """Time all cases of a route table, returns ``{case: us per op}``."""
+    generate = TABLES[table]
+
+    def timed(func):
+        return measure(func, min_time=min_time)
+
+    # 规则只能绑定一个 map，每次构建都用新生成的规则，生成不计入时间
+    times = []
+    for _ in range(REPEAT):
+        rules, probes = generate(count)
+        start = timeit.default_timer()
+        map = Map(rules, engine=engine)
+        map.update()
+        times.append(timeit.default_timer() - start)
+    result = {'construct': min(times) * 1e6}
+
+    subdomain, path = probes['match']
+    adapter = map.bind('example.org', '/', subdomain)
+    result['match'] = timed(lambda: adapter.match(path))
+    subdomain, miss = probes['miss']
+    adapter = map.bind('example.org', '/', subdomain)
+    result['match_miss'] = timed(_expect(lambda: adapter.match(miss),
+                                         NotFound))
+    subdomain, redirect = probes['redirect']
+    adapter = map.bind('example.org', '/', subdomain)
+    result['redirect'] = timed(_expect(lambda: adapter.match(redirect),
+                                       RequestRedirect))
+    endpoint, values = probes['build']
+    result['build'] = timed(lambda: adapter.build(endpoint, values))
+    endpoint, query_values = probes['build_query']
+    result['build_query'] = timed(
+        lambda: adapter.build(endpoint, query_values))
+    environ = {
+        'wsgi.url_scheme': 'http',
+        'SERVER_NAME': subdomain and subdomain + '.example.org' or
+        'example.org',
+        'SERVER_PORT': '80',
+        'SCRIPT_NAME': '',
+        'REQUEST_METHOD': 'GET',
+    }
+    result['bind_to_environ'] = timed(
+        lambda: map.bind_to_environ(environ, server_name='example.org'))
+    return result
+
+
+def run(tables=None, sizes=DEFAULT_SIZES, engines=None, out=None,
+        min_time=MIN_TIME):
+    """
+    Run the benchmarks and return the JSON document.  Progress lines go
+    to `out` if given.
+    """
+    results = []
+    for table in tables or sorted(TABLES):
+        for size in sizes:
+            for engine in engines or sorted(MATCHERS):
+                cases = bench_table(table, size, engine, min_time)
+                for case, us in sorted(cases.items()):
+                    results.append({'table': table, 'size': size,
+                                    'engine': engine, 'case': case,
+                                    'us': round(us, 3)})
+                if out is not None:
+                    out.write('%-10s %6d %-7s %s\n' % (
+                        table, size, engine, '  '.join(
+                            '%s: %.2fus' % item
+                            for item in sorted(cases.items()))))
+                    out.flush()
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare(before, after, threshold=1.2):
+    """
+    Return the ``(key, before, after)`` of the cases in both documents
+    that got slower by more than the `threshold` factor.
+    """
+    def index(document):
+        return dict(((item['table'], item['size'], item['engine'],
+                      item['case']), item['us'])
+                    for item in document['results'])
+    old = index(before)
+    regressions = []
+    for key, us in sorted(index(after).items()):
+        if key in old and us > old[key] * threshold:
+            regressions.append((key, old[key], us))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m url_router.bench',
+        description='Benchmark url maps on synthetic route tables.')
+    parser.add_argument('--tables', default=','.join(sorted(TABLES)),
+                        help='comma separated route tables')
+    parser.add_argument('--sizes',
+                        default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma separated numbers of rules')
+    parser.add_argument('--engines', default=','.join(sorted(MATCHERS)),
+                        help='comma separated matching engines')
+    parser.add_argument('--min-time', type=float, default=MIN_TIME,
+                        help='seconds per timing run')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two JSON result files')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='slowdown factor reported by --compare')
+    args = parser.parse_args(args)
+
+    if args.compare:
+        documents = []
+        for filename in args.compare:
+            with open(filename) as f:
+                documents.append(json.load(f))
+        regressions = compare(documents[0], documents[1], args.threshold)
+        for (table, size, engine, case), old, new in regressions:
+            print('%-10s %6d %-7s %-16s %10.2fus -> %10.2fus (%.2fx)' % (
+                table, size, engine, case, old, new, new / old))
+        return regressions and 1 or 0
+
+    for table in args.tables.split(','):
+        if table not in TABLES:
+            parser.error('unknown route table %r' % table)
+    for engine in args.engines.split(','):
+        if engine not in MATCHERS:
+            parser.error('unknown engine %r' % engine)
+    rv = run(args.tables.split(','),
+             [int(size) for size in args.sizes.split(',')],
+             args.engines.split(','),
+             out=not args.json and sys.stdout or None,
+             min_time=args.min_time)
+    if args.json:
+        json.dump(rv, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,8 +10,15 @@ class BaseConverter(object):
     """
     Base class for all converters.
     """
+    __slots__ = ('map',)
     regex = '[^/]+'
     is_greedy = False
+    # 是否可能匹配斜杠，None 表示由 is_greedy 和 regex 推断，见 matches_slash
+    matches_slash = None
+    weight = 100  # 排序权重，越小越先匹配
+    # 可选的协程方法，接收 to_python 的结果，返回最终的值或者抛出
+    # ValidationError，见 MapAdapter.match_async
+    to_python_async = None
 
     def __init__(self, map):
         self.map = map
@@ -28,6 +35,7 @@ class UnicodeConverter(BaseConverter):
     The default converter for all URL parts. Matches one string without a
     slash in the part. Can also check for the length of that string.
     """
+    __slots__ = ('regex',)
 
     def __init__(self, map, minlength=1, maxlength=None, length=None):
         BaseConverter.__init__(self, map)
@@ -49,14 +57,18 @@ class PathConverter(BaseConverter):
     """
     Matches a whole path (including slashes)
     """
+    __slots__ = ()
     regex = '[^/].*'  # 匹配路径
     is_greedy = True  # 贪婪的
+    weight = 200
 
 
 class NumberConverter(BaseConverter):
     """
     Baseclass for `IntegerConverter` and `FloatConverter`.
     """
+    __slots__ = ('fixed_digits', 'min', 'max')
+    weight = 50
 
     def __init__(self, map, fixed_digits=0, min=None, max=None):
         BaseConverter.__init__(self, map)
@@ -86,6 +98,7 @@ class IntegerConverter(NumberConverter):
     """
     Only accepts integers.
     """
+    __slots__ = ()
     regex = r'\d+'  # 匹配整型
     num_convert = int
 
@@ -94,8 +107,124 @@ class FloatConverter(NumberConverter):
     """
     Only accepts floats and integers.
     """
+    __slots__ = ()
     regex = r'\d+\.\d+'  # 匹配浮点数
     num_convert = float
 
     def __init__(self, map, min=None, max=None):
         NumberConverter.__init__(self, map, 0, min, max)
+
+
+def matches_slash(convobj):
+    """
+    Check if a converter may match a slash.  The `matches_slash` attribute
+    of the converter decides if it is set, otherwise greedy converters and
+    converters whose regular expression cannot be shown to exclude slashes
+    may.  Matchers that split paths into segments only keep converters
+    that do not.
+    """
+    rv = convobj.matches_slash
+    if rv is None:
+        rv = convobj.is_greedy or regex_matches_slash(convobj.regex)
+    return rv
+
+
+# 转义字符：这些不匹配斜杠，大写的 \D \S \W 和数字（八进制、反向引用）可能匹配
+_SLASH_FREE_ESCAPES = frozenset('dswbBAZ')
+
+_regex_cache = {}
+
+
+def regex_matches_slash(regex):
+    r"""
+    Check if a regular expression may match a slash.  The check is
+    conservative: ``.``, ``/``, ``\D``, ``\S``, ``\W``, numeric escapes
+    and character classes that are not shown to exclude ``/`` count as
+    matching one.
+
+    >>> regex_matches_slash(r'[^/]+'), regex_matches_slash(r'\d+\.\d+')
+    (False, False)
+    >>> regex_matches_slash(r'[^/]+/[^/]+'), regex_matches_slash('.+')
+    (True, True)
+    >>> regex_matches_slash('[a-z0-9_-]+'), regex_matches_slash('[!-z]+')
+    (False, True)
+    """
+    rv = _regex_cache.get(regex)
+    if rv is None:
+        rv = _regex_cache[regex] = _scan_regex(regex)
+    return rv
+
+
+def _scan_regex(regex):
+    i = 0
+    n = len(regex)
+    while i < n:
+        char = regex[i]
+        if char == '\\':
+            escaped = regex[i + 1:i + 2]
+            if escaped == '/' or escaped.isalnum() and \
+                    escaped not in _SLASH_FREE_ESCAPES:
+                return True
+            i += 2
+        elif char == '[':
+            end, items = _class_items(regex, i + 1)
+            if end is None:
+                return True
+            negated = items[:1] == ['^']
+            if negated:
+                # 排除了斜杠的取反字符集不会匹配斜杠
+                if '/' not in items and '\\/' not in items:
+                    return True
+            elif _class_matches_slash(items):
+                return True
+            i = end + 1
+        elif char in './':
+            return True
+        else:
+            i += 1
+    return False
+
+
+def _class_items(regex, i):
+    """
+    Split a character class starting after its ``[`` into items, single
+    characters or two character escapes.  Returns the index of the closing
+    ``]`` and the items, or `None` if the class does not end.
+    """
+    items = []
+    if regex[i:i + 1] == '^':
+        items.append('^')
+        i += 1
+    first = True
+    while i < len(regex):
+        char = regex[i]
+        if char == ']' and not first:
+            return i, items
+        if char == '\\':
+            items.append(regex[i:i + 2])
+            i += 2
+        else:
+            items.append(char)
+            i += 1
+        first = False
+    return None, items
+
+
+def _class_matches_slash(items):
+    for index, item in enumerate(items):
+        if len(item) == 2:
+            escaped = item[1:]
+            if escaped == '/' or escaped.isalnum() and \
+                    escaped not in _SLASH_FREE_ESCAPES:
+                return True
+        elif item == '/':
+            return True
+        elif item == '-' and 0 < index < len(items) - 1:
+            # 范围的两端是单个字符时，检查斜杠是否落在范围里
+            low, high = items[index - 1], items[index + 1]
+            low = low[-1] if len(low) == 2 and not low[1].isalnum() else low
+            high = high[-1] if len(high) == 2 and \
+                not high[1].isalnum() else high
+            if len(low) != 1 or len(high) != 1 or low <= '/' <= high:
+                return True
+    return False
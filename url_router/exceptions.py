@@ -21,7 +21,15 @@ class NotFound(HTTPException):
 
 
 class MethodNotAllowed(HTTPException):
-    pass
+    """
+    The path matched but none of the matching rules accepts the request
+    method.  `valid_methods` is the sorted list of methods that would have
+    been accepted.
+    """
+
+    def __init__(self, valid_methods=None):
+        HTTPException.__init__(self, valid_methods)
+        self.valid_methods = valid_methods
 
 
 class BuildError(RoutingException, LookupError):
@@ -0,0 +1,174 @@
+"""
+运行统计
+
+Optional instrumentation of a map: counters of the match and build
+outcomes, per endpoint counters, latency histograms and the number of
+rules a match tries::
+
+    stats = Instrumentation(sink=statsd_sink)
+    map = Map(rules, instrumentation=stats)
+    ...
+    stats.snapshot()
+
+:meth:`Map.bind` returns an adapter that reports to the instrumentation
+only if the map has one, plain adapters do not pay for it.  The counters
+are updated without a lock, concurrent requests may lose a count now and
+then.
+"""
+
+from bisect import bisect_left
+
+
+# 延迟直方图的桶上界，单位微秒，最后一个桶没有上界
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000,
+                   10000, 100000)
+
+# 每次匹配尝试的规则数的直方图的桶上界
+ATTEMPT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+# 默认每多少次匹配统计一次尝试的规则数
+ATTEMPT_SAMPLE = 16
+
+MATCH_OUTCOMES = ('hit', 'redirect', 'not_found', 'method_not_allowed')
+BUILD_OUTCOMES = ('hit', 'error')
+
+
+class Histogram(object):
+    """Count values in buckets with fixed upper bounds.
+
+    A value goes into the first bucket whose bound is not smaller, values
+    above the last bound into an open bucket.
+
+    Usage::
+
+        >>> histogram = Histogram((1, 10))
+        >>> for value in 0.5, 3, 10, 20:
+        ...     histogram.add(value)
+        >>> histogram.info()
+        {'count': 4, 'total': 33.5, 'max': 20, 'buckets': [(1, 1), (10, 2), (None, 1)]}
+
+    :param bounds: sorted sequence of numbers
+    """
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def info(self):
+        """Return the count, sum, maximum and the buckets as dict."""
+        return {
+            'count': self.count,
+            'total': self.total,
+            'max': self.max,
+            'buckets': list(zip(self.bounds + (None,), self.counts)),
+        }
+
+
+def count_attempts(trace, method):
+    """
+    Count the rules of a :meth:`BaseMatcher.trace` up to the one that wins
+    for the request method, or all of them if none does.
+    """
+    count = 0
+    for rule, rv in trace:
+        count += 1
+        if rv is not False and (rule.methods is None or
+                                method in rule.methods):
+            break
+    return count
+
+
+class Instrumentation(object):
+    """
+    Collects the outcomes and latencies of the matches and builds of the
+    adapters of a map.
+
+    `sink`
+        If given, called with ``(operation, endpoint, outcome, seconds)``
+        after every match and build, for example to forward them to a
+        metrics system.  `operation` is ``'match'`` or ``'build'``, the
+        `endpoint` is `None` for matches that did not find a rule.
+
+    `attempt_sample`
+        Every `attempt_sample`-th match is traced again to count the rules
+        the matching engine tried, see :meth:`BaseMatcher.trace`.  The
+        trace skips the match cache.  ``0`` turns the counting off.
+
+    `latency_buckets`
+        The bounds of the latency histograms in microseconds.
+    """
+
+    def __init__(self, sink=None, attempt_sample=ATTEMPT_SAMPLE,
+                 latency_buckets=LATENCY_BUCKETS):
+        self.sink = sink
+        self.attempt_sample = attempt_sample
+        self.latency_buckets = latency_buckets
+        self.reset()
+
+    def reset(self):
+        """Set all counters and histograms back to zero."""
+        self.outcomes = {
+            'match': dict.fromkeys(MATCH_OUTCOMES, 0),
+            'build': dict.fromkeys(BUILD_OUTCOMES, 0),
+        }
+        self.latency = {
+            'match': Histogram(self.latency_buckets),
+            'build': Histogram(self.latency_buckets),
+        }
+        self.attempts = Histogram(ATTEMPT_BUCKETS)
+        # endpoint -> {(operation, outcome): count}
+        self.endpoints = {}
+        self._countdown = self.attempt_sample
+
+    def record(self, operation, endpoint, outcome, seconds):
+        """Count one match or build."""
+        self.outcomes[operation][outcome] += 1
+        self.latency[operation].add(seconds * 1e6)
+        if endpoint is not None:
+            counts = self.endpoints.get(endpoint)
+            if counts is None:
+                counts = self.endpoints[endpoint] = {}
+            key = (operation, outcome)
+            counts[key] = counts.get(key, 0) + 1
+        if self.sink is not None:
+            self.sink(operation, endpoint, outcome, seconds)
+
+    def sample_attempts(self):
+        """Tell if the rule attempts of the current match should be counted."""
+        if not self.attempt_sample:
+            return False
+        self._countdown -= 1
+        if self._countdown > 0:
+            return False
+        self._countdown = self.attempt_sample
+        return True
+
+    def snapshot(self):
+        """
+        Return the counters as dict: the outcomes and latency histograms
+        of ``'match'`` and ``'build'``, the histogram of the sampled
+        ``'attempts'`` and the ``'endpoints'`` with their match hits,
+        builds and build errors.
+        """
+        endpoints = {}
+        for endpoint, counts in list(self.endpoints.items()):
+            endpoints[endpoint] = {
+                'hits': counts.get(('match', 'hit'), 0),
+                'builds': counts.get(('build', 'hit'), 0),
+                'build_errors': counts.get(('build', 'error'), 0),
+            }
+        rv = {'attempts': self.attempts.info(), 'endpoints': endpoints}
+        for operation in 'match', 'build':
+            rv[operation] = dict(self.outcomes[operation])
+            rv[operation]['latency_us'] = self.latency[operation].info()
+        return rv
@@ -1,9 +1,61 @@
+import os
+import re
+import asyncio
+import inspect
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from tempfile import mkstemp
+from operator import itemgetter
+from threading import Lock, Thread
+from time import perf_counter
 from urllib.parse import urljoin
+from weakref import WeakKeyDictionary
 
 from .converters import (
     UnicodeConverter, IntegerConverter, PathConverter, FloatConverter
 )
-from .exceptions import RequestRedirect, NotFound, BuildError, RequestSlash
+from .exceptions import (
+    RequestRedirect, NotFound, MethodNotAllowed, BuildError, RequestSlash,
+    ValidationError
+)
+from .matcher import (
+    MATCHERS, StaticMatcher, SubdomainMatcher, CachingMatcher, merge_items,
+    profile_order
+)
+from .instrument import count_attempts
+from .rule import Rule
+from .utils import LRUCache, split_subdomain
+
+
+# build 时按参数签名缓存可用规则的数量
+BUILD_CACHE_SIZE = 1024
+
+# Map.dump 的格式版本，格式改变时加一
+SNAPSHOT_VERSION = 6
+
+# dispatch_async 运行同步视图函数的线程数
+DISPATCH_THREADS = 8
+
+# 每个事件循环缓存的 to_python_async 结果数
+ASYNC_CONVERTER_CACHE_SIZE = 1024
+
+_executor = None  # dispatch_async 默认的线程池
+_executor_lock = Lock()
+
+# 事件循环 -> LRUCache，(转换器, 值) -> 转换结果
+_async_caches = WeakKeyDictionary()
+
+_missing = object()
+_invalid = object()  # 缓存 to_python_async 抛出的 ValidationError
+
+
+# urljoin 不会改写的相对路径：没有 scheme、空白和控制字符、params、fragment、
+# 空的段以及 "." 和 ".." 段，query string 不能为空
+_plain_join_re = re.compile(r'''
+    (?:[^\x00-\x20:;?\#/.] | /(?![/.]) | (?<=[^/])\.)*
+    (?:\?[^\x00-\x20\#]+)?
+''', re.VERBOSE)
 
 
 DEFAULT_CONVERTERS = {
@@ -21,7 +73,9 @@ class Map(object):
     """
 
     def __init__(self, rules=None, default_subdomain='', charset='utf-8',
-                 strict_slashes=True, converters=None):
+                 strict_slashes=True, converters=None, engine='linear',
+                 cache_size=None, sort_rules=True, lazy=False,
+                 instrumentation=None):
         """
         `rules`
             sequence of url rules for this map.
@@ -39,10 +93,60 @@ class Map(object):
             A dict of converters that adds additional converters to the
             list of converters. If you redefine one converter this will
             override the original one.
+
+        `engine`
+            The matching engine used by :meth:`MapAdapter.match`, one of the
+            keys of :data:`url_router.matcher.MATCHERS`.  ``'linear'`` tries
+            the rules one after another, ``'trie'`` compiles them into a
+            trie keyed on path segments and ``'regex'`` joins all rule
+            regexes into a single alternation.
+
+        `cache_size`
+            If set, the path-level results of :meth:`MapAdapter.match` for
+            the last `cache_size` ``(subdomain, path)`` pairs are kept in an
+            LRU cache, shared by all request methods and including `NotFound`
+            and redirect outcomes.  The cache is emptied whenever rules are
+            added or removed.  See :meth:`cache_info`.
+
+        `sort_rules`
+            Order the rules by :meth:`Rule.match_compare_key` before
+            matching, so specific rules are tried before generic ones.  If
+            false the rules are tried in the order they were added.
+
+        `lazy`
+            Do not compile the regular expressions of the rules when they
+            are added.  A rule regex is compiled by the first match that
+            reaches the rule, and the ``'regex'`` engine compiles its
+            alternations on first use as well, so maps with many rarely
+            used rules start faster.  See :meth:`warm_up`.
+
+        `instrumentation`
+            An :class:`~url_router.instrument.Instrumentation` that counts
+            the matches and builds of the adapters bound to the map, see
+            :class:`InstrumentedMapAdapter`.  It is not pickled with the
+            map.
         """
-        self._rules = []  # 存储规则
+        if engine not in MATCHERS:
+            raise LookupError('the matching engine %r does not exist' % engine)
         self._rules_by_endpoint = {}
-        self._remap = True  # 修改标志位，True表示需要重新排序
+        # id(rule) -> (rule, 序号)，按添加顺序排列
+        self._rule_orders = {}
+        self._sequence = 0  # 下一条规则的添加序号
+        # 编译好的 CompiledMap，None 表示需要重新编译。修改规则时换成新的
+        # CompiledMap，match 和 build 不需要加锁
+        self._compiled = None
+        self._lock = Lock()  # 修改规则和编译时加锁
+        self._cache = None  # 最新的匹配结果缓存
+        if cache_size:
+            self._cache = LRUCache(cache_size)
+        # (转换器名, args, kwargs) -> 共用的转换器实例
+        self._converter_cache = {}
+
+        self.engine = engine
+        self.sort_rules = sort_rules
+        self.lazy = lazy
+        self.instrumentation = instrumentation
+        self._hits = None  # 见 profile_order
 
         self.default_subdomain = default_subdomain
         self.charset = charset
@@ -51,6 +155,14 @@ class Map(object):
         if converters:
             self.converters.update(converters)
 
+        # map 参数的哈希，见 dump 和 load
+        self._definition_seed = _chain_hash('', (
+            default_subdomain, charset, strict_slashes,
+            sorted([(name, _class_path(cls))
+                    for name, cls in self.converters.items()]),
+            engine, cache_size, sort_rules
+        ))
+
         # 把 rules 加入 _rules
         for rulefactory in rules or ():
             self.add(rulefactory)
@@ -67,30 +179,130 @@ class Map(object):
 
         迭代所有规则，并检查它的 endpoint 是否需要提供参数。
         """
-        self.update()
+        arguments_by_endpoint = self.update().arguments_by_endpoint
         arguments = set(arguments)
-        for rule in self._rules_by_endpoint[endpoint]:
-            if arguments.issubset(rule.arguments):
+        for rule_arguments in arguments_by_endpoint[endpoint]:
+            if arguments.issubset(rule_arguments):
                 return True
         return False
 
+    def get_build_rules(self, endpoint, values, method):
+        """
+        Return the rules of the endpoint that are suitable for building with
+        the keys of `values` and the method, in rule order.  The result is
+        looked up by the argument signature ``(endpoint, keys, method)``.
+        """
+        return self.update().get_build_rules(endpoint, values, method)
+
     def iter_rules(self, endpoint=None):
-        """Iterate over all rules or the rules of an endpoint."""
+        """
+        Iterate over all rules or the rules of an endpoint.  All rules are
+        always in match order, the map is compiled first if it changed.
+        The rules of an endpoint are in the order they were added.
+        """
         if endpoint is not None:
             return iter(self._rules_by_endpoint[endpoint])
-        return iter(self._rules)
+        return iter(self.update().rules)
 
     def add(self, rulefactory):
         """
         添加一个新rule或一个map工厂，并绑定它，而且这个rule没有绑定其他map。
+
+        Once the map is compiled, new rules are inserted into a copy of the
+        compiled map that shares everything the rules do not touch, and
+        the copy replaces the compiled map in one step.  Matches running in
+        other threads keep using the compiled map they started with.  With
+        :meth:`profile_order` hits the map is recompiled on the next match
+        instead.
         """
+        rules = []
         for rule in rulefactory.get_rules(self):
             rule.bind(self)
-            # 加入 self._rules
-            self._rules.append(rule)
-            # 加入 self._rules_by_endpoint
-            self._rules_by_endpoint.setdefault(rule.endpoint, []).append(rule)
-        self._remap = True  # 需要排序标志位
+            rules.append(rule)
+        with self._lock:
+            compiled = self._compiled
+            if self._hits:
+                # profile_order 之后的顺序和序号不一致，不能增量更新
+                compiled = None
+            items = []
+            for rule in rules:
+                # 新建列表，iter_rules 可能正在遍历旧列表
+                self._rules_by_endpoint[rule.endpoint] = \
+                    self._rules_by_endpoint.get(rule.endpoint, []) + [rule]
+                order = None  # 还没有编译，等 update 统一编号
+                if compiled is not None:
+                    order = self._rule_order(rule, self._sequence)
+                    self._sequence += 1
+                    items.append((order, rule))
+                self._rule_orders[id(rule)] = (rule, order)
+            if compiled is not None:
+                # 所有新规则一起插入，编译好的 map 只复制一次
+                compiled = compiled.with_rules(items).with_endpoints(
+                    self._rules_by_endpoint,
+                    set([rule.endpoint for rule in rules]))
+            self._publish(compiled)
+
+    def remove(self, rule_or_endpoint):
+        """
+        Remove a rule, or all rules of an endpoint, from the map.  Like
+        :meth:`add` the compiled map is replaced by an updated copy.
+        Raises `LookupError` if the rule is not in the map or the endpoint
+        has no rules.  Removed rules stay bound to the map and cannot be
+        added again.
+
+
+        删除一个 rule 或一个 endpoint 的所有 rules。
+        """
+        with self._lock:
+            if isinstance(rule_or_endpoint, Rule):
+                if id(rule_or_endpoint) not in self._rule_orders:
+                    raise LookupError('the url rule %r is not in the map' %
+                                      rule_or_endpoint.rule)
+                rules = [rule_or_endpoint]
+            else:
+                rules = self._rules_by_endpoint.get(rule_or_endpoint)
+                if not rules:
+                    raise LookupError('the endpoint %r has no rules' %
+                                      rule_or_endpoint)
+                rules = list(rules)
+            compiled = self._compiled
+            if self._hits:
+                compiled = None
+            items = []
+            for rule in rules:
+                order = self._rule_orders.pop(id(rule))[1]
+                by_endpoint = [other for other in
+                               self._rules_by_endpoint[rule.endpoint]
+                               if other is not rule]
+                if by_endpoint:
+                    self._rules_by_endpoint[rule.endpoint] = by_endpoint
+                else:
+                    del self._rules_by_endpoint[rule.endpoint]
+                items.append((order, rule))
+            if compiled is not None:
+                compiled = compiled.without_rules(items).with_endpoints(
+                    self._rules_by_endpoint,
+                    set([rule.endpoint for rule in rules]))
+            self._publish(compiled)
+
+    def _rule_order(self, rule, sequence):
+        """
+        The order of a rule in the compiled map: the sort key and the
+        sequence number of the rule, so rules with the same sort key keep
+        the order they were added in.
+        """
+        if self.sort_rules:
+            return rule.match_compare_key(), sequence
+        return sequence
+
+    def _publish(self, compiled):
+        """
+        Replace the compiled map, `None` compiles the map on the next use.
+        Must be called with the lock held.
+        """
+        if compiled is not None and self._cache is not None:
+            self._cache = compiled.matcher.cache
+        self._compiled = compiled
 
     def bind(self, server_name, script_name=None, subdomain=None,
              url_scheme='http', default_method='GET'):
@@ -109,6 +321,10 @@ class Map(object):
             subdomain = self.default_subdomain
         if script_name is None:
             script_name = '/'
+        if self.instrumentation is not None:
+            return InstrumentedMapAdapter(self, server_name, script_name,
+                                          subdomain, url_scheme,
+                                          default_method)
         return MapAdapter(self, server_name, script_name, subdomain,
                           url_scheme, default_method)
 
@@ -135,24 +351,409 @@ class Map(object):
                    in (('https', '443'), ('http', '80')):
                     server_name += ':' + environ['SERVER_PORT']
         elif subdomain is None:
-            cur_server_name = environ['SERVER_NAME'].split('.')
-            real_server_name = server_name.split(':', 1)[0].split('.')
-            offset = -len(real_server_name)
-            if cur_server_name[offset:] != real_server_name:
+            subdomain = split_subdomain(environ['SERVER_NAME'], server_name)
+            if subdomain is None:
                 raise ValueError('the server name provided (%r) does not match the '
                                  'server name from the WSGI environment (%r)' %
                                  (environ['SERVER_NAME'], server_name))
-            subdomain = '.'.join(filter(None, cur_server_name[:offset]))
         return Map.bind(self, server_name, environ.get('SCRIPT_NAME'), subdomain,
                         environ['wsgi.url_scheme'], environ['REQUEST_METHOD'])
 
+    def __getstate__(self):
+        """
+        Pickle the bound rules without the compiled map and caches.  The
+        rules keep their parsed traces, converters and regexes, so
+        unpickling does not parse them again; the map is compiled on the
+        first match.
+        """
+        state = self.__dict__.copy()
+        state['_compiled'] = None
+        # id 在反序列化后会变，只保留添加顺序
+        state['_rule_orders'] = [rule for rule, order
+                                 in list(self._rule_orders.values())]
+        del state['_lock']
+        # sink 一般不能序列化，统计也只属于当前进程
+        state['instrumentation'] = None
+        if self._cache is not None:
+            state['_cache'] = LRUCache(self._cache.maxsize)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rule_orders = dict([(id(rule), (rule, None))
+                                  for rule in state['_rule_orders']])
+        self._lock = Lock()
+
+    def dump(self, filename):
+        """
+        Save a snapshot of the map with its parsed rules and converters.
+        The rule regexes are stored as source and compiled on first use.
+        The snapshot is written to a temporary file in the same directory
+        and then renamed, so :meth:`load` never sees a partly written one.
+        See :meth:`load`.
+        """
+        header = {
+            'version': SNAPSHOT_VERSION,
+            'definition_hash': self._definition_hash(
+                [rule for rule, order in list(self._rule_orders.values())]),
+        }
+        directory, name = os.path.split(os.path.abspath(filename))
+        fd, tmp = mkstemp(prefix='.%s.' % name, suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, filename)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, filename, rules=None, lazy=None, instrumentation=None,
+             **kwargs):
+        """
+        Restore a map saved with :meth:`dump` without parsing the rules
+        again.
+
+        If `rules` and the keyword arguments of the map are given they are
+        hashed without binding them and compared with the hash stored in
+        the snapshot.  A snapshot of another format version, of other rule
+        definitions or one that cannot be unpickled (a truncated file, or
+        converter classes that moved) raises `ValueError`, so the caller
+        can build the map from the rules instead::
+
+            try:
+                map = Map.load('routes.snapshot', rules, instrumentation=stats)
+            except (IOError, ValueError):
+                map = Map(rules, instrumentation=stats)
+                map.dump('routes.snapshot')
+
+        Only `lazy` and `instrumentation` are applied to the loaded map,
+        they are not part of the hash.  `instrumentation` replaces the one
+        dropped by :meth:`dump`.  `lazy` is kept from the dumped map if
+        `None`; ``lazy=False`` compiles the map and the rule regexes right
+        away, see :meth:`warm_up`.  The other keyword arguments only take
+        part in the hash check, the loaded map keeps the ones it was
+        dumped with.
+        """
+        with open(filename, 'rb') as f:
+            header = _unpickle(f, filename)
+            if not isinstance(header, dict) or \
+                    header.get('version') != SNAPSHOT_VERSION:
+                raise ValueError('unsupported map snapshot %r' % filename)
+            if rules is not None:
+                probe = cls(**kwargs)
+                definition_hash = probe._definition_hash([
+                    rule for rulefactory in rules
+                    for rule in rulefactory.get_rules(probe)
+                ])
+                if definition_hash != header['definition_hash']:
+                    raise ValueError('map snapshot %r does not match the '
+                                     'rules' % filename)
+            rv = _unpickle(f, filename)
+        rv.instrumentation = instrumentation
+        if lazy is not None:
+            rv.lazy = lazy
+            if not lazy:
+                rv.warm_up()
+        return rv
+
+    def _definition_hash(self, rules):
+        """Hash the map arguments and the definitions of `rules`."""
+        rv = self._definition_seed
+        for rule in rules:
+            rv = _chain_hash(rv, _rule_definition(self, rule))
+        return rv
+
+    def profile_order(self, hits):
+        """
+        Try frequently matched rules earlier.  `hits` maps endpoints to
+        observed hit counts, for example the ``'endpoints'`` of a
+        :mod:`url_router.replay` report.  Rules only move past rules that can
+        never match the same request, so match results stay the same.
+        Pass `None` to go back to the plain order.
+        """
+        with self._lock:
+            self._hits = hits and dict(hits) or None
+            self._compiled = None
+
+    def warm_up(self, background=False):
+        """
+        Compile the map and the regular expressions a `lazy` map defers, so
+        later matches do not pay for them.  With `background` the work is
+        done in a daemon thread, which is returned; matching meanwhile
+        works as usual and compiles what it needs itself::
+
+            map = Map(rules, lazy=True)
+            map.warm_up(background=True)
+        """
+        if background:
+            thread = Thread(target=self.warm_up, name='url_router-warm-up',
+                            daemon=True)
+            thread.start()
+            return thread
+        self.update().matcher.warm_up()
+
+    def cache_info(self):
+        """
+        Return the hit, miss and eviction counters and the size of the
+        match cache as dict, or `None` if the map has no cache.
+        """
+        if self._cache is None:
+            return None
+        return self._cache.info()
+
     def update(self):
         """
-        Called before matching and building to keep the compiled rules
-        in the correct order after things changed.
+        Compile the rules if they changed and return the current
+        :class:`CompiledMap`.  Matching and building only use the returned
+        object, so they take no locks.
         """
-        if self._remap:
-            self._remap = False
+        compiled = self._compiled
+        if compiled is not None:
+            return compiled
+        with self._lock:
+            if self._compiled is None:
+                self._publish(self._compile())
+            return self._compiled
+
+    def _compile(self):
+        # 按添加顺序重新编号，排序和稳定排序的结果相同
+        items = []
+        for sequence, (rule, order) in \
+                enumerate(list(self._rule_orders.values())):
+            order = self._rule_order(rule, sequence)
+            self._rule_orders[id(rule)] = (rule, order)
+            items.append((order, rule))
+        self._sequence = len(items)
+        items.sort(key=itemgetter(0))
+        rules = [rule for order, rule in items]
+        orders = [order for order, rule in items]
+        if self._hits:
+            # profile_order 之后的顺序不再和序号一致，不能增量更新
+            rules = profile_order(rules, self._hits)
+            orders = list(range(len(rules)))
+        engine = MATCHERS[self.engine]
+        if engine.by_subdomain:
+            matcher = engine(rules, orders)
+        else:
+            # 每个子域名只匹配自己的规则
+            matcher = SubdomainMatcher(rules, engine, orders)
+        # 静态规则先查哈希表，查不到再交给匹配引擎
+        matcher = StaticMatcher(rules, matcher, orders)
+        if self._cache is not None:
+            matcher = CachingMatcher(rules, matcher,
+                                     self._cache.empty_copy(), orders)
+        build_index = {}
+        arguments_by_endpoint = {}
+        _index_endpoints(build_index, arguments_by_endpoint,
+                         self._rules_by_endpoint, self._rules_by_endpoint)
+        return CompiledMap(rules, orders, matcher, build_index,
+                           arguments_by_endpoint, LRUCache(BUILD_CACHE_SIZE))
+
+
+class CompiledMap(object):
+    """
+    The compiled state of a :class:`Map`: the bound rules in match order
+    with their orders, the matcher and the build index.  It is not changed
+    after the map published it, only its caches fill up.  Adding or
+    removing rules builds a new compiled map with :meth:`with_rules`,
+    :meth:`without_rules` and :meth:`with_endpoints` that shares the parts
+    the change does not touch, and the map swaps it in with one
+    assignment.
+    """
+
+    __slots__ = ('rules', 'orders', 'matcher', 'build_index',
+                 'arguments_by_endpoint', 'build_cache')
+
+    def __init__(self, rules, orders, matcher, build_index,
+                 arguments_by_endpoint, build_cache):
+        self.rules = rules
+        self.orders = orders
+        self.matcher = matcher
+        # endpoint -> [(arguments, methods, rule)]
+        self.build_index = build_index
+        # endpoint -> 不重复的参数集合
+        self.arguments_by_endpoint = arguments_by_endpoint
+        # (endpoint, 参数签名, method) -> 可用的 rules
+        self.build_cache = build_cache
+
+    def get_build_rules(self, endpoint, values, method):
+        """See :meth:`Map.get_build_rules`."""
+        keys = frozenset(values)
+        key = (endpoint, keys, method)
+        cache = self.build_cache
+        rules = cache.get(key)
+        if rules is None:
+            rules = tuple([
+                rule for arguments, methods, rule
+                in self.build_index.get(endpoint) or ()
+                if (methods is None or method in methods) and arguments <= keys
+            ])
+            cache.set(key, rules)
+        return rules
+
+    def with_rules(self, items):
+        """
+        Return a copy that also matches the bound rules of `items`,
+        ``(order, rule)`` pairs.  The lists and the matcher are copied
+        once for all of them.
+        """
+        return self._changed(items, True)
+
+    def without_rules(self, items):
+        """
+        Return a copy that no longer matches the rules of `items`, the
+        ``(order, rule)`` pairs they were added with.
+        """
+        return self._changed(items, False)
+
+    def _changed(self, items, added):
+        items = sorted(items, key=itemgetter(0))
+        orders, rules = merge_items(self.orders, self.rules, items, added)
+        if added:
+            matcher = self.matcher.with_rules(items, rules, orders)
+        else:
+            matcher = self.matcher.without_rules(items, rules, orders)
+        return CompiledMap(rules, orders, matcher, self.build_index,
+                           self.arguments_by_endpoint, self.build_cache)
+
+    def with_endpoints(self, rules_by_endpoint, endpoints):
+        """
+        Return a copy with the build index of `endpoints` taken from
+        `rules_by_endpoint` and an empty build cache.
+        """
+        build_index = self.build_index.copy()
+        arguments_by_endpoint = self.arguments_by_endpoint.copy()
+        _index_endpoints(build_index, arguments_by_endpoint,
+                         rules_by_endpoint, endpoints)
+        return CompiledMap(self.rules, self.orders, self.matcher,
+                           build_index, arguments_by_endpoint,
+                           self.build_cache.empty_copy())
+
+
+def _index_endpoints(build_index, arguments_by_endpoint, rules_by_endpoint,
+                     endpoints):
+    """按 endpoint 索引规则的参数集合和方法集合"""
+    for endpoint in endpoints:
+        rules = rules_by_endpoint.get(endpoint)
+        if not rules:
+            build_index.pop(endpoint, None)
+            arguments_by_endpoint.pop(endpoint, None)
+            continue
+        index = []
+        seen = []
+        for rule in rules:
+            arguments = frozenset(rule.arguments)
+            methods = None
+            if rule.methods is not None:
+                methods = frozenset(rule.methods)
+            index.append((arguments, methods, rule))
+            if arguments not in seen:
+                seen.append(arguments)
+        build_index[endpoint] = index
+        arguments_by_endpoint[endpoint] = seen
+
+
+def _default_executor():
+    """The thread pool for synchronous views, created on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    DISPATCH_THREADS, thread_name_prefix='url_router')
+    return _executor
+
+
+def _has_async_converters(rule):
+    for convobj in rule._converters.values():
+        if convobj.to_python_async is not None:
+            return True
+    return False
+
+
+async def _convert_async(rule, args):
+    """
+    Run the ``to_python_async`` hooks of the converters of a rule on a
+    copy of the matched arguments.  Raises :class:`ValidationError` if a
+    hook does not accept its value.
+    """
+    loop = asyncio.get_event_loop()
+    cache = _async_caches.get(loop)
+    if cache is None:
+        cache = _async_caches[loop] = LRUCache(ASYNC_CONVERTER_CACHE_SIZE)
+    args = dict(args)
+    for name, value in list(args.items()):
+        convobj = rule._converters[name]
+        if convobj.to_python_async is None:
+            continue
+        key = (convobj, value)
+        rv = cache.get(key, _missing)
+        if rv is _missing:
+            try:
+                rv = await convobj.to_python_async(value)
+            except ValidationError:
+                rv = _invalid
+            cache.set(key, rv)
+        if rv is _invalid:
+            raise ValidationError()
+        args[name] = rv
+    return args
+
+
+def _explain_miss(rule, path):
+    """
+    Tell why a rule did not match for :meth:`MapAdapter.explain`:
+    ``('invalid', argument name)`` if a converter rejected its value,
+    otherwise ``('no_match', None)``.
+    """
+    m = rule.get_regex().search(path)
+    if m is not None:
+        groups = m.groups()
+        for name, index, to_python in rule._match_plan:
+            if to_python is None:
+                continue
+            try:
+                to_python(groups[index])
+            except ValidationError:
+                return 'invalid', name
+    return 'no_match', None
+
+
+def _class_path(cls):
+    return '%s.%s' % (cls.__module__, cls.__name__)
+
+
+def _rule_definition(map, rule):
+    """
+    The arguments a rule was created with, with the defaults of the map
+    filled in like :meth:`Rule.bind` does.
+    """
+    methods = rule.methods
+    if methods is not None:
+        methods = sorted(methods)
+    subdomain = rule.subdomain
+    if subdomain is None:
+        subdomain = map.default_subdomain
+    strict_slashes = rule.strict_slashes
+    if strict_slashes is None:
+        strict_slashes = map.strict_slashes
+    return (_class_path(rule.__class__), rule.rule, subdomain, methods,
+            rule.is_build_only, rule.endpoint, strict_slashes)
+
+
+def _chain_hash(previous, data):
+    return sha1((previous + repr(data)).encode('utf-8')).hexdigest()
+
+
+def _unpickle(f, filename):
+    """Unpickle the next object of a snapshot, `ValueError` if it is broken."""
+    try:
+        return pickle.load(f)
+    except (EOFError, pickle.UnpicklingError, AttributeError,
+            ImportError) as e:
+        raise ValueError('cannot read map snapshot %r: %s' % (filename, e))
 
 
 class MapAdapter(object):
@@ -169,6 +770,9 @@ class MapAdapter(object):
         if not script_name.endswith('/'):
             script_name += '/'
         self.script_name = script_name
+        # script_name 没有 urljoin 会改写的部分时 build 可以直接拼接字符串
+        self._plain_script_name = '?' not in script_name and \
+            _plain_join_re.fullmatch(script_name) is not None
         self.subdomain = subdomain
         self.url_scheme = url_scheme
         self.default_method = default_method
@@ -186,39 +790,209 @@ class MapAdapter(object):
             return e
         return view_func(endpoint, args)
 
+    async def dispatch_async(self, view_func, path_info, method=None,
+                             executor=None):
+        """ 异步调度视图函数
+
+        Like :meth:`dispatch` but for asyncio servers.  Coroutine view
+        functions are awaited, other view functions run on `executor`,
+        by default a pool of :data:`DISPATCH_THREADS` threads shared by all
+        maps, so they do not block the event loop.  Matching works like
+        :meth:`match_async`.
+
+        :param view_func: callable(endpoint, args) or coroutine function
+        :param path_info: str
+        :param method: str
+        :param executor: concurrent.futures.Executor
+        """
+        try:
+            endpoint, args = await self.match_async(path_info, method,
+                                                    executor)
+        except RequestRedirect as e:
+            return e
+        if inspect.iscoroutinefunction(view_func):
+            return await view_func(endpoint, args)
+        return await asyncio.get_event_loop().run_in_executor(
+            executor or _default_executor(), view_func, endpoint, args)
+
+    async def match_async(self, path_info, method=None, executor=None):
+        """ 异步匹配URL
+
+        Like :meth:`match`, but also awaits the ``to_python_async`` hooks
+        of the converters of the matched rule, for example to look up a
+        slug in a database.  If a hook raises :class:`ValidationError` the
+        next matching rule is tried, like for a converter that does not
+        accept its value.  The results of the hooks are cached per event
+        loop for the last :data:`ASYNC_CONVERTER_CACHE_SIZE` converter and
+        value pairs, so the values must be hashable.  If the map has to be
+        compiled first that happens on `executor`.
+
+        :param path_info: str
+        :param method: str
+        :param executor: concurrent.futures.Executor
+        """
+        if self.map._compiled is None:
+            await asyncio.get_event_loop().run_in_executor(
+                executor or _default_executor(), self.map.update)
+        matcher = self.map.update().matcher
+        if not isinstance(path_info, str):
+            path_info = path_info.decode(self.map.charset, 'ignore')
+        path = path_info.lstrip('/')
+        method = (method or self.default_method).upper()
+        try:
+            rule, rv = matcher.match(self.subdomain, path, method)
+        except RequestSlash:
+            raise self._slash_redirect(path)
+        if not _has_async_converters(rule):
+            return rule.endpoint, rv
+
+        # 和 resolve_method 相同，只是还要等待异步转换
+        have_match_for = set()
+        for rule, rv in matcher.iter_matches(self.subdomain, path):
+            if rule.methods is not None and method not in rule.methods:
+                if rv is not None:
+                    have_match_for.update(rule.methods)
+                continue
+            if rv is None:
+                raise self._slash_redirect(path)
+            try:
+                return rule.endpoint, await _convert_async(rule, rv)
+            except ValidationError:
+                continue
+        if have_match_for:
+            raise MethodNotAllowed(sorted(have_match_for))
+        raise NotFound()
+
     def match(self, path_info, method=None):
         """ 匹配URL
 
+        Raises :class:`NotFound` if no rule matches the path and
+        :class:`MethodNotAllowed` with the allowed methods if rules match
+        the path but none of them accepts the method.
+
         :param path_info: str
         :param method: str
         """
-        self.map.update()
+        matcher = self.map.update().matcher
         if not isinstance(path_info, str):
             path_info = path_info.decode(self.map.charset, 'ignore')
-        path = u'%s|/%s(%s)' % (
-            self.subdomain,
-            path_info.lstrip('/'),
-            (method or self.default_method).upper()
-        )
-
-        # 每次 match 都要遍历 map._rules
-        for rule in self.map._rules:
+        path = path_info.lstrip('/')
+        try:
+            rule, rv = matcher.match(
+                self.subdomain,
+                path,
+                (method or self.default_method).upper()
+            )
+        except RequestSlash:
+            # 请求重定向异常
+            raise self._slash_redirect(path)
+        return rule.endpoint, rv  # 返回 endpoint 和参数
+
+    def match_many(self, paths, method=None):
+        """ 批量匹配URL
+
+        Match many paths with the same method and yield the results in
+        order.  Matches are yielded as ``(endpoint, args)`` tuples, misses
+        and redirects as :class:`NotFound`, :class:`MethodNotAllowed` and
+        :class:`RequestRedirect` objects instead of being raised.  The
+        compiled matcher of the map is looked up once for the whole batch.
+
+        :param paths: iterable of str
+        :param method: str
+        """
+        do_match = self.map.update().matcher.match
+        subdomain = self.subdomain
+        charset = self.map.charset
+        method = (method or self.default_method).upper()
+        for path_info in paths:
+            if not isinstance(path_info, str):
+                path_info = path_info.decode(charset, 'ignore')
+            path = path_info.lstrip('/')
             try:
-                rv = rule.match(path)
+                rule, rv = do_match(subdomain, path, method)
+            except (NotFound, MethodNotAllowed) as e:
+                yield e
             except RequestSlash:
-                # 请求重定向异常
-                raise RequestRedirect(str('%s://%s%s%s/%s/' % (
-                    self.url_scheme,  # url scheme
-                    self.subdomain and self.subdomain + '.' or '',  # 子域名
-                    self.server_name,  # 域名
-                    self.script_name[:-1],  # 路径
-                    path_info.lstrip('/')
-                )))
-            # 返回值没有参数，继续循环
-            if rv is None:
-                continue
-            return rule.endpoint, rv  # 返回 endpoint 和参数
-        raise NotFound()  # 抛出 NotFound 异常
+                yield self._slash_redirect(path)
+            else:
+                yield rule.endpoint, rv
+
+    def explain(self, path_info, method=None):
+        """ 解释一次匹配
+
+        Match the path like :meth:`match` and return what the matching
+        engine did as dict:
+
+        ``'steps'``
+            the rules the engine checked, in order, as dicts with the
+            ``'rule'``, the ``'seconds'`` spent on it and the ``'result'``:
+            ``'match'``, ``'redirect'`` (the path lacks the trailing slash
+            of the rule), ``'method'`` (the rule does not accept the method),
+            ``'invalid'`` (the ``'converter'`` of the named argument raised
+            :class:`ValidationError`) or ``'no_match'``.
+        ``'outcome'``
+            ``'match'``, ``'redirect'``, ``'method_not_allowed'`` or
+            ``'not_found'``, the same result :meth:`match` has.
+        ``'rule'``, ``'args'``
+            the winning rule and its arguments, or `None`.
+        ``'seconds'``
+            the time of all steps.
+
+        Which rules are checked depends on the engine: the ``'linear'``
+        engine checks every rule, the ``'trie'`` engine only the rules
+        along the path and a rule regex of the ``'regex'`` engine is checked
+        with all rules of its chunk.  The match cache is not used.  Slower
+        than :meth:`match`, meant for finding out why a path is slow or
+        where it goes.
+
+        :param path_info: str
+        :param method: str
+        """
+        matcher = self.map.update().matcher
+        if not isinstance(path_info, str):
+            path_info = path_info.decode(self.map.charset, 'ignore')
+        path = path_info.lstrip('/')
+        method = (method or self.default_method).upper()
+        full_path = u'%s|/%s' % (self.subdomain, path)
+        steps = []
+        rv = {'steps': steps, 'outcome': 'not_found', 'rule': None,
+              'args': None, 'seconds': 0}
+        have_match_for = set()
+        trace = matcher.trace(self.subdomain, path)
+        while True:
+            start = perf_counter()
+            try:
+                rule, args = next(trace)
+            except StopIteration:
+                break
+            step = {'rule': rule, 'seconds': perf_counter() - start,
+                    'converter': None}
+            steps.append(step)
+            rv['seconds'] += step['seconds']
+            if args is False:
+                step['result'], step['converter'] = \
+                    _explain_miss(rule, full_path)
+            elif rule.methods is not None and method not in rule.methods:
+                step['result'] = 'method'
+                if args is not None:
+                    have_match_for.update(rule.methods)
+            else:
+                step['result'] = args is None and 'redirect' or 'match'
+                rv.update(outcome=step['result'], rule=rule, args=args)
+                break
+        if rv['rule'] is None and have_match_for:
+            rv['outcome'] = 'method_not_allowed'
+        return rv
+
+    def _slash_redirect(self, path):
+        """Return the redirect to the path with a trailing slash."""
+        return RequestRedirect(str('%s://%s%s%s/%s/' % (
+            self.url_scheme,  # url scheme
+            self.subdomain and self.subdomain + '.' or '',  # 子域名
+            self.server_name,  # 域名
+            self.script_name[:-1],  # 路径
+            path
+        )))
 
     def build(self, endpoint, values=None, method=None, force_external=False):
         """ 构建URL
@@ -228,28 +1002,156 @@ class MapAdapter(object):
         :param method: str
         :param force_external: bool, 是否构建全部URL
         """
-        self.map.update()
+        compiled = self.map.update()
         method = method or self.default_method
         if values:
-            values = dict([(k, v) for k, v in values.items() if v is not None])
+            values = {k: v for k, v in values.items() if v is not None}
         else:
             values = {}
 
-        for rule in self.map._rules_by_endpoint.get(endpoint) or ():
-            if rule.suitable_for(values, method):
-                rv = rule.build(values)
-                if rv is not None:
-                    break
-        else:
-            raise BuildError(endpoint, values)
-        subdomain, path = rv
+        rules = compiled.get_build_rules(endpoint, values, method)
+        subdomain, path = self._build_with(rules, endpoint, values)
         if not force_external and subdomain == self.subdomain:
-            return str(urljoin(self.script_name, path.lstrip('/')))
+            return self._join_script_name(path.lstrip('/'))
         # 拼接字符串成URL
-        return str('%s://%s%s%s/%s' % (
+        return self._external_prefix(subdomain) + path.lstrip('/')
+
+    def build_many(self, endpoint, values_list, method=None,
+                   force_external=False):
+        """ 批量构建URL
+
+        Build one URL per dict in `values_list` and yield them in order.
+        The suitable rules are looked up once per distinct set of keys and
+        the scheme, host and script name prefixes are reused, the results are
+        the same as calling :meth:`build` in a loop.
+
+        :param endpoint: str, 端点
+        :param values_list: iterable of dict
+        :param method: str
+        :param force_external: bool, 是否构建全部URL
+        """
+        method = method or self.default_method
+        get_build_rules = self.map.update().get_build_rules
+        signatures = {}  # 参数签名 -> rules
+        prefixes = {}  # subdomain -> 外部URL前缀
+        for values in values_list:
+            if values:
+                values = {k: v for k, v in values.items() if v is not None}
+            else:
+                values = {}
+            keys = frozenset(values)
+            rules = signatures.get(keys)
+            if rules is None:
+                rules = signatures[keys] = get_build_rules(endpoint, keys,
+                                                           method)
+            subdomain, path = self._build_with(rules, endpoint, values)
+            if not force_external and subdomain == self.subdomain:
+                yield self._join_script_name(path.lstrip('/'))
+                continue
+            prefix = prefixes.get(subdomain)
+            if prefix is None:
+                prefix = prefixes[subdomain] = self._external_prefix(subdomain)
+            yield prefix + path.lstrip('/')
+
+    def _build_with(self, rules, endpoint, values):
+        """Build `(subdomain, path)` with the first rule that works."""
+        for rule in rules:
+            rv = rule.build(values)
+            if rv is not None:
+                return rv
+        raise BuildError(endpoint, values)
+
+    def _join_script_name(self, path):
+        """Join the script name and a path without leading slash."""
+        if self._plain_script_name and \
+                _plain_join_re.fullmatch(path) is not None:
+            # 结果和 urljoin 相同
+            return self.script_name + path
+        return str(urljoin(self.script_name, path))
+
+    def _external_prefix(self, subdomain):
+        """Return scheme, host and script name of an external URL."""
+        return str('%s://%s%s%s/' % (
             self.url_scheme,
             subdomain and subdomain + '.' or '',
             self.server_name,
-            self.script_name[:-1],
-            path.lstrip('/')
+            self.script_name[:-1]
         ))
+
+
+class InstrumentedMapAdapter(MapAdapter):
+    """
+    A :class:`MapAdapter` that reports every match and build to the
+    `instrumentation` of its map.  :meth:`Map.bind` only returns it for
+    maps with instrumentation, so :class:`MapAdapter` stays free of it.
+    """
+
+    def _record_match(self, start, endpoint, outcome, path_info, method):
+        stats = self.map.instrumentation
+        stats.record('match', endpoint, outcome, perf_counter() - start)
+        if stats.sample_attempts():
+            if not isinstance(path_info, str):
+                path_info = path_info.decode(self.map.charset, 'ignore')
+            trace = self.map.update().matcher.trace(self.subdomain,
+                                                    path_info.lstrip('/'))
+            stats.attempts.add(count_attempts(
+                trace, (method or self.default_method).upper()))
+
+    def match(self, path_info, method=None):
+        start = perf_counter()
+        try:
+            endpoint, args = MapAdapter.match(self, path_info, method)
+        except RequestRedirect:
+            self._record_match(start, None, 'redirect', path_info, method)
+            raise
+        except NotFound:
+            self._record_match(start, None, 'not_found', path_info, method)
+            raise
+        except MethodNotAllowed:
+            self._record_match(start, None, 'method_not_allowed', path_info,
+                               method)
+            raise
+        self._record_match(start, endpoint, 'hit', path_info, method)
+        return endpoint, args
+
+    async def match_async(self, path_info, method=None, executor=None):
+        start = perf_counter()
+        try:
+            endpoint, args = await MapAdapter.match_async(
+                self, path_info, method, executor)
+        except RequestRedirect:
+            self._record_match(start, None, 'redirect', path_info, method)
+            raise
+        except NotFound:
+            self._record_match(start, None, 'not_found', path_info, method)
+            raise
+        except MethodNotAllowed:
+            self._record_match(start, None, 'method_not_allowed', path_info,
+                               method)
+            raise
+        self._record_match(start, endpoint, 'hit', path_info, method)
+        return endpoint, args
+
+    def match_many(self, paths, method=None):
+        for path_info in paths:
+            try:
+                yield self.match(path_info, method)
+            except (NotFound, MethodNotAllowed, RequestRedirect) as e:
+                yield e
+
+    def build(self, endpoint, values=None, method=None, force_external=False):
+        stats = self.map.instrumentation
+        start = perf_counter()
+        try:
+            rv = MapAdapter.build(self, endpoint, values, method,
+                                  force_external)
+        except BuildError:
+            stats.record('build', endpoint, 'error', perf_counter() - start)
+            raise
+        stats.record('build', endpoint, 'hit', perf_counter() - start)
+        return rv
+
+    def build_many(self, endpoint, values_list, method=None,
+                   force_external=False):
+        for values in values_list:
+            yield self.build(endpoint, values, method, force_external)
@@ -0,0 +1,1195 @@
+"""
+匹配引擎
+
+`MapAdapter.match` 不直接遍历 rules，而是交给 map 编译好的匹配器。
+每个匹配器都接收 `(subdomain, path, method)`，其中 `path` 是去掉开头斜杠的
+path_info，`method` 已经是大写。匹配成功返回 `(rule, args)`，
+否则抛出 :class:`NotFound`；路径匹配但方法不允许时抛出
+:class:`MethodNotAllowed`；需要补斜杠时抛出 :class:`RequestSlash`。
+
+路径和方法分开检查：引擎只实现 `iter_matches` ，按规则顺序产生路径匹配的
+rules，`resolve_method` 再从中选出允许该方法的第一个。
+
+每条规则有一个可比较的序号 `order` ，序号递增的顺序就是规则顺序。增删规则时
+`with_rules` 和 `without_rules` 返回新的匹配器，一次调用只复制一次，只重建
+受影响的部分，其余部分和原来的匹配器共用。匹配器建好之后不再修改，并发的
+`match` 不需要加锁。
+"""
+
+import re
+from copy import copy
+from bisect import bisect_left, bisect_right, insort
+from heapq import merge
+from operator import itemgetter
+
+from .exceptions import (
+    NotFound, MethodNotAllowed, RequestSlash, ValidationError
+)
+from .converters import matches_slash
+
+
+def resolve_method(matches, method):
+    """
+    Pick the first of the path-level `matches` that accepts the method.
+    `matches` are ``(rule, args)`` pairs in rule order, `args` is `None` if
+    the path lacks the trailing slash of the rule.  Raises
+    :class:`RequestSlash`, :class:`MethodNotAllowed` or :class:`NotFound`.
+    """
+    have_match_for = set()
+    for rule, rv in matches:
+        if rule.methods is not None and method not in rule.methods:
+            if rv is not None:
+                have_match_for.update(rule.methods)
+            continue
+        if rv is None:
+            raise RequestSlash()
+        return rule, rv
+    if have_match_for:
+        raise MethodNotAllowed(sorted(have_match_for))
+    raise NotFound()
+
+
+class BaseMatcher(object):
+    """
+    Base class for all matching engines.  A matcher is compiled from the
+    list of bound rules of a map and their ascending `orders` (the indexes
+    of the rules if not given).  A matcher is not changed after it was
+    built, :meth:`with_rule` and :meth:`without_rule` return updated copies
+    that share what the change does not touch.
+    """
+
+    #: 引擎自己按子域名分开规则，不需要 SubdomainMatcher
+    by_subdomain = False
+
+    def __init__(self, rules, orders=None):
+        self.rules = rules
+        if orders is None:
+            orders = range(len(rules))
+        self.orders = orders
+
+    def _copy(self, rules, orders):
+        rv = copy(self)
+        rv.rules = rules
+        rv.orders = orders
+        return rv
+
+    def with_rules(self, items, rules, orders):
+        """
+        Return a matcher that also has the bound rules of `items`,
+        ``(order, rule)`` pairs in rule order.  `rules` and `orders` are
+        the new lists of the map that already contain the rules.  The
+        matcher is copied once and all rules are added to the copy.
+        """
+        rv = self._copy(rules, orders)
+        rv._update(items, True)
+        return rv
+
+    def without_rules(self, items, rules, orders):
+        """
+        Return a matcher without the rules of `items`, the ``(order,
+        rule)`` pairs they were added with, in rule order.  `rules` and
+        `orders` are the new lists of the map without the rules.
+        """
+        rv = self._copy(rules, orders)
+        rv._update(items, False)
+        return rv
+
+    def _update(self, items, added):
+        """
+        Add or remove rules in the private copy made by :meth:`with_rules`
+        or :meth:`without_rules`.  Nothing to do for engines that only
+        look at `rules`.
+        """
+
+    def warm_up(self):
+        """
+        Compile what was deferred to the first match, by default the
+        regexes of the rules of a `lazy` map.
+        """
+        for rule in self.rules:
+            if not rule.is_build_only:
+                rule.get_regex()
+
+    def iter_matches(self, subdomain, path):
+        """
+        Yield the ``(rule, args)`` pairs of the rules whose path matches,
+        in rule order and without looking at the request method.  `args`
+        is `None` if the rule wants a redirect to the path with a trailing
+        slash.
+        """
+        raise NotImplementedError()
+
+    def match(self, subdomain, path, method):
+        return resolve_method(self.iter_matches(subdomain, path), method)
+
+    def trace(self, subdomain, path):
+        """
+        Yield ``(rule, result)`` for every rule the engine checks while
+        matching the path, in the order it checks them and without looking
+        at the request method.  `result` is the args if the path matches,
+        `None` if the rule wants a trailing slash and `False` otherwise.
+        Slower than :meth:`iter_matches`, used to count and explain the
+        work of a match.
+        """
+        path = u'%s|/%s' % (subdomain, path)
+        for rule in self.rules:
+            if not rule.is_build_only:
+                yield rule, _check_rule(rule, path)
+
+
+def merge_items(orders, rules, changes, added):
+    """
+    Return copies of `orders` and `rules` with the ``(order, rule)``
+    pairs of `changes` inserted, or removed if not `added`.
+    """
+    orders = list(orders)
+    rules = list(rules)
+    for order, rule in changes:
+        pos = bisect_left(orders, order)
+        if added:
+            orders.insert(pos, order)
+            rules.insert(pos, rule)
+        else:
+            del orders[pos], rules[pos]
+    return orders, rules
+
+
+def _changed_matcher(matcher, items, rules, orders, added):
+    """Call `with_rules` or `without_rules` of a matcher."""
+    if added:
+        return matcher.with_rules(items, rules, orders)
+    return matcher.without_rules(items, rules, orders)
+
+
+def _check_rule(rule, path):
+    """Check one rule for :meth:`BaseMatcher.trace`."""
+    try:
+        rv = rule.match(path)
+    except RequestSlash:
+        return None
+    if rv is None:
+        return False
+    return rv
+
+
+def _match_rule(rule, path):
+    """Match one rule, a missing trailing slash gives ``(rule, None)``."""
+    try:
+        rv = rule.match(path)
+    except RequestSlash:
+        return rule, None
+    if rv is None:
+        return None
+    return rule, rv
+
+
+class LinearMatcher(BaseMatcher):
+    """
+    Tries every rule in order and returns the first one that matches.
+    """
+
+    def iter_matches(self, subdomain, path):
+        path = u'%s|/%s' % (subdomain, path)
+
+        # 每次 match 都要遍历所有 rules
+        for rule in self.rules:
+            rv = _match_rule(rule, path)
+            # 没有匹配，继续循环
+            if rv is not None:
+                yield rv
+
+    def match(self, subdomain, path, method):
+        # 和 resolve_method(self.iter_matches(...)) 相同，但这是最常用的路径，
+        # 省掉生成器的开销
+        path = u'%s|/%s' % (subdomain, path)
+        have_match_for = None
+        for rule in self.rules:
+            methods = rule.methods
+            try:
+                rv = rule.match(path)
+            except RequestSlash:
+                if methods is None or method in methods:
+                    raise
+                continue
+            if rv is None:
+                continue
+            if methods is not None and method not in methods:
+                if have_match_for is None:
+                    have_match_for = set()
+                have_match_for.update(methods)
+                continue
+            return rule, rv
+        if have_match_for:
+            raise MethodNotAllowed(sorted(have_match_for))
+        raise NotFound()
+
+
+class _Node(object):
+    """One path segment of the trie."""
+
+    __slots__ = ('static', 'dynamic', 'rules', 'fallback')
+
+    def __init__(self):
+        self.static = {}    # segment -> _Node
+        self.dynamic = []   # [(converter regex, _Node)]，按加入顺序尝试
+        self.rules = []     # [(index, rule, names)]，在此结束的 rules
+        self.fallback = []  # [(index, rule)]，需要用完整正则匹配的 rules
+
+    def copy(self):
+        rv = _Node()
+        rv.static = self.static.copy()
+        rv.dynamic = list(self.dynamic)
+        rv.rules = list(self.rules)
+        rv.fallback = list(self.fallback)
+        return rv
+
+
+def _own_node(node, owned):
+    """
+    A node that can be changed: `node` itself while the trie is built,
+    otherwise a copy made once per change, or a new node for `None`.
+    """
+    if node is None:
+        node = _Node()
+    elif owned is None or id(node) in owned:
+        return node
+    else:
+        node = node.copy()
+    if owned is not None:
+        owned.add(id(node))
+    return node
+
+
+def _rule_segments(rule):
+    """
+    Split the path of a bound rule into segments.  Every segment is a list
+    of ``(is_dynamic, data)`` items.  Returns `None` for rules with a
+    dynamic subdomain.
+    """
+    if '<' in rule.subdomain:
+        return None
+    trace = rule._trace if rule.is_leaf else rule._trace[:-1]
+    # 第一个静态部分以 "subdomain|" 开头
+    prefix = len(rule.subdomain) + 1
+    segments = []
+    for is_dynamic, data in trace:
+        if is_dynamic:
+            segments[-1].append((True, data))
+            continue
+        if prefix:
+            data = data[prefix:]
+            prefix = 0
+        pieces = data.split('/')
+        if pieces[0]:
+            segments[-1].append((False, pieces[0]))
+        for piece in pieces[1:]:
+            segments.append(piece and [(False, piece)] or [])
+    return segments
+
+
+def _trie_steps(rule, segments):
+    """
+    Turn the segments of a rule into trie steps, ``(None, static data)``
+    or ``(variable, converter regex)``.  Returns `None` if a segment mixes
+    static data and variables or has a converter that may match a slash
+    or an empty segment.
+    """
+    steps = []
+    for segment in segments:
+        if not segment:
+            steps.append((None, ''))
+            continue
+        if len(segment) == 1:
+            is_dynamic, data = segment[0]
+            if not is_dynamic:
+                steps.append((None, data))
+                continue
+            convobj = rule._converters[data]
+            # 能匹配空段的转换器要靠规则正则式里斜杠前的 (?<!/) 判断
+            if not matches_slash(convobj) and \
+                    re.fullmatch(convobj.regex, '', re.UNICODE) is None:
+                steps.append((data, convobj.regex))
+                continue
+        return None
+    return steps
+
+
+def _static_prefix(segments):
+    """The trie steps of the static segments a rule starts with."""
+    steps = []
+    for segment in segments:
+        if len(segment) != 1 or segment[0][0]:
+            break
+        steps.append((None, segment[0][1]))
+    return steps
+
+
+def _segment_kinds(rule, segments):
+    """
+    Classify the segments of a rule for :func:`rules_disjoint`: a static
+    string, a compiled converter regex or `None` if the segment is neither
+    or has a converter that may match a slash, so the segments after it
+    cannot be lined up with the path.
+    """
+    kinds = []
+    for segment in segments:
+        if not segment:
+            kinds.append('')
+        elif len(segment) != 1:
+            kinds.append(None)
+        elif not segment[0][0]:
+            kinds.append(segment[0][1])
+        else:
+            convobj = rule._converters[segment[0][1]]
+            if matches_slash(convobj):
+                kinds.append(None)
+            else:
+                kinds.append(re.compile(convobj.regex, re.UNICODE))
+    return kinds
+
+
+def rules_disjoint(a, b, _kinds=None):
+    """
+    Check if two rules can never both match the same request, so their
+    order does not matter.  Returns `False` if that cannot be told cheaply.
+    """
+    if a.is_build_only or b.is_build_only:
+        return True
+    if a.methods is not None and b.methods is not None and \
+            not set(a.methods) & set(b.methods):
+        return True
+    if '<' in a.subdomain or '<' in b.subdomain:
+        return False
+    if a.subdomain != b.subdomain:
+        return True
+
+    if _kinds is None:
+        _kinds = {}
+    kinds = []
+    for rule in a, b:
+        rv = _kinds.get(id(rule))
+        if rv is None:
+            rv = _kinds[id(rule)] = _segment_kinds(rule, _rule_segments(rule))
+        kinds.append(rv)
+    ka, kb = kinds
+
+    # 请求的段数：严格斜杠的叶子规则是 n，其他还可能是 n + 1
+    if None not in ka and None not in kb:
+        la = set([len(ka)])
+        if not a.is_leaf or not a.strict_slashes:
+            la.add(len(ka) + 1)
+        lb = set([len(kb)])
+        if not b.is_leaf or not b.strict_slashes:
+            lb.add(len(kb) + 1)
+        if not la & lb:
+            return True
+
+    for x, y in zip(ka, kb):
+        if x is None or y is None:
+            break
+        x_static = x.__class__ is str
+        y_static = y.__class__ is str
+        if x_static and y_static:
+            if x != y:
+                return True
+        elif x_static:
+            if y.fullmatch(x) is None:
+                return True
+        elif y_static:
+            if x.fullmatch(y) is None:
+                return True
+    return False
+
+
+def profile_order(rules, hits):
+    """
+    Move rules with many hits forward.  `hits` maps endpoints to observed
+    hit counts.  A rule only moves past rules that are colder and
+    :func:`rules_disjoint` with it, so the match results do not change.
+    """
+    rules = list(rules)
+    kinds = {}
+    hot = [rule for rule in rules if hits.get(rule.endpoint)]
+    hot.sort(key=lambda rule: -hits[rule.endpoint])
+    for rule in hot:
+        count = hits[rule.endpoint]
+        pos = target = [i for i, other in enumerate(rules) if other is rule][0]
+        while target > 0:
+            other = rules[target - 1]
+            if hits.get(other.endpoint, 0) >= count or \
+                    not rules_disjoint(rule, other, kinds):
+                break
+            target -= 1
+        if target != pos:
+            del rules[pos]
+            rules.insert(target, rule)
+    return rules
+
+
+class TrieMatcher(BaseMatcher):
+    """
+    Compiles the rules into a trie keyed on path segments.  Static segments
+    are dict lookups, converter segments are tried in a fixed order (the
+    order they were first seen in), so the match cost depends on the depth
+    of the path rather than on the number of rules.
+
+    Rules the trie cannot represent (dynamic subdomains, converters that
+    may match slashes or empty segments, segments that mix static data and
+    variables) hang off the deepest static node they share with the trie
+    and are checked with their own regular expression.
+
+    All candidates are resolved in rule order, so the result is the same as
+    the one of :class:`LinearMatcher`.
+    """
+
+    by_subdomain = True
+
+    def __init__(self, rules, orders=None):
+        BaseMatcher.__init__(self, rules, orders)
+        self._roots = {}     # subdomain -> _Node
+        self._wildcard = []  # [(order, rule)]，动态子域名的 rules
+        for order, rule in zip(self.orders, rules):
+            if not rule.is_build_only:
+                self._insert(order, rule)
+
+    def _copy(self, rules, orders):
+        rv = BaseMatcher._copy(self, rules, orders)
+        rv._roots = self._roots.copy()
+        rv._wildcard = list(self._wildcard)
+        return rv
+
+    def _update(self, items, added):
+        # 这次修改里已经复制过的节点，不用再复制
+        owned = set()
+        for order, rule in items:
+            if rule.is_build_only:
+                continue
+            if added:
+                self._insert(order, rule, owned)
+            else:
+                self._delete(rule, owned)
+
+    def _insert(self, index, rule, owned=None):
+        segments = _rule_segments(rule)
+        if segments is None:
+            self._wildcard.append((index, rule))
+            return
+        steps = _trie_steps(rule, segments)
+        if steps is None:
+            # 无法放进 trie，挂在静态前缀的最后一个节点上，退回到正则匹配
+            node = self._walk(rule.subdomain, _static_prefix(segments),
+                              owned)[-1][2]
+            node.fallback.append((index, rule))
+            return
+        node = self._walk(rule.subdomain, steps, owned)[-1][2]
+        node.rules.append((index, rule, tuple([
+            name for name, key in steps if name is not None])))
+
+    def _walk(self, subdomain, steps, owned):
+        """
+        Follow the steps from the root of a subdomain, creating missing
+        nodes, and return the ``(parent, key, node)`` path.  If `owned` is
+        not `None` the nodes on the path are copies, so tries that share
+        the nodes do not see the change.  `owned` holds the ids of the
+        nodes this trie already copied or created, they are not copied
+        again.
+        """
+        node = _own_node(self._roots.get(subdomain), owned)
+        self._roots[subdomain] = node
+        path = [(None, subdomain, node)]
+        for name, key in steps:
+            parent = node
+            if name is None:
+                node = parent.static[key] = \
+                    _own_node(parent.static.get(key), owned)
+            else:
+                for i, (regex, child) in enumerate(parent.dynamic):
+                    if regex.pattern == key:
+                        node = _own_node(child, owned)
+                        if node is not child:
+                            parent.dynamic[i] = (regex, node)
+                        break
+                else:
+                    node = _own_node(None, owned)
+                    parent.dynamic.append((re.compile(key, re.UNICODE), node))
+            path.append((parent, key, node))
+        return path
+
+    def _delete(self, rule, owned):
+        segments = _rule_segments(rule)
+        if segments is None:
+            self._wildcard = [item for item in self._wildcard
+                              if item[1] is not rule]
+            return
+        steps = _trie_steps(rule, segments)
+        is_fallback = steps is None
+        if is_fallback:
+            steps = _static_prefix(segments)
+        # 规则不在 trie 上时不做任何修改
+        node = self._roots.get(rule.subdomain)
+        for name, key in steps:
+            if node is None:
+                return
+            if name is None:
+                node = node.static.get(key)
+            else:
+                node = self._find_dynamic_child(node, key)
+        if node is None:
+            return
+        # 复制经过的节点，删除后把空节点从 trie 上摘掉
+        path = self._walk(rule.subdomain, steps, owned)
+        node = path[-1][2]
+        if is_fallback:
+            node.fallback = [item for item in node.fallback
+                             if item[1] is not rule]
+        else:
+            node.rules = [item for item in node.rules
+                          if item[1] is not rule]
+        self._prune(path)
+
+    def _prune(self, path):
+        for parent, key, node in reversed(path):
+            if node.static or node.dynamic or node.rules or node.fallback:
+                return
+            if parent is None:
+                del self._roots[key]
+            elif parent.static.get(key) is node:
+                del parent.static[key]
+            else:
+                parent.dynamic = [item for item in parent.dynamic
+                                  if item[1] is not node]
+
+    def _find_dynamic_child(self, node, regex):
+        for child_regex, child in node.dynamic:
+            if child_regex.pattern == regex:
+                return child
+        return None
+
+    def _collect(self, node, segs, i, values, method, out):
+        n = len(segs)
+        if node.fallback:
+            out.extend((index, rule, None, False)
+                       for index, rule in node.fallback)
+        if node.rules:
+            if i == n:
+                for index, rule, names in node.rules:
+                    if method is None or rule.methods is None or \
+                            method in rule.methods:
+                        out.append((index, rule, dict(zip(names, values)),
+                                    not rule.is_leaf))
+            elif i == n - 1 and not segs[i]:
+                # 带结尾斜杠的请求
+                for index, rule, names in node.rules:
+                    if rule.is_leaf and rule.strict_slashes:
+                        continue
+                    if method is None or rule.methods is None or \
+                            method in rule.methods:
+                        out.append((index, rule, dict(zip(names, values)),
+                                    False))
+        if i == n:
+            return
+        seg = segs[i]
+        child = node.static.get(seg)
+        if child is not None:
+            self._collect(child, segs, i + 1, values, method, out)
+        for regex, child in node.dynamic:
+            if regex.fullmatch(seg) is not None:
+                values.append(seg)
+                self._collect(child, segs, i + 1, values, method, out)
+                values.pop()
+
+    def candidates(self, subdomain, path, method=None):
+        """
+        Return the rules that may match the path, in rule order, as
+        ``(order, rule, values, missing_slash)`` tuples.  `values` is `None`
+        for rules that have to be checked with their own regex.  If `method`
+        is `None` the methods of the rules are not checked.
+        """
+        candidates = [(index, rule, None, False)
+                      for index, rule in self._wildcard]
+        root = self._roots.get(subdomain)
+        if root is not None:
+            self._collect(root, path.split('/'), 0, [], method, candidates)
+        candidates.sort(key=itemgetter(0))
+        return candidates
+
+    def iter_matches(self, subdomain, path):
+        full_path = u'%s|/%s' % (subdomain, path)
+        for index, rule, values, missing_slash in \
+                self.candidates(subdomain, path):
+            if values is None:
+                # 退回到规则自己的正则式
+                rv = _match_rule(rule, full_path)
+                if rv is not None:
+                    yield rv
+                continue
+            if missing_slash and rule.strict_slashes:
+                yield rule, None
+                continue
+            values = _convert_values(rule, values)
+            if values is not None:
+                yield rule, values
+
+    def trace(self, subdomain, path):
+        full_path = u'%s|/%s' % (subdomain, path)
+        for index, rule, values, missing_slash in \
+                self.candidates(subdomain, path):
+            if values is None:
+                yield rule, _check_rule(rule, full_path)
+            elif missing_slash and rule.strict_slashes:
+                yield rule, None
+            else:
+                values = _convert_values(rule, values)
+                yield rule, values is not None and values
+
+
+def _convert_values(rule, values):
+    """
+    Run the converters of a rule on the segment values collected by the
+    trie, `None` if a converter does not accept its value.
+    """
+    try:
+        for name, index, to_python in rule._match_plan:
+            if to_python is not None:
+                values[name] = to_python(values[name])
+    except ValidationError:
+        return None
+    return values
+
+
+class RegexMatcher(BaseMatcher):
+    """
+    Joins the regular expressions of the rules into alternations.  Every
+    rule is a named branch and the group names of the rule are prefixed with
+    the branch name, so one `re.match` tells which rule won and where its
+    arguments are.
+
+    The `re` module saves the state of all groups when it backtracks into
+    the next branch, so a single alternation of thousands of rules gets
+    slower than the plain loop.  The rules are therefore joined in chunks
+    of `chunk_size` branches.
+
+    If a converter of the winning rule does not accept its value the
+    remaining rules are tried one after another, just like
+    :class:`LinearMatcher` does.
+
+    Chunks of rules whose regexes are not compiled yet, as in a `lazy` map
+    or a loaded snapshot, are compiled by the first match that reaches
+    them.
+    """
+
+    chunk_size = 50
+
+    def __init__(self, rules, orders=None):
+        BaseMatcher.__init__(self, rules, orders)
+        # [(match, {branch name: (position, rule, group offset)},
+        #   orders, rules)]，按规则顺序排列的分块，分支名是块内的位置；
+        # 延迟编译的分块 match 和 names 是 None
+        self._chunks = []
+        items = [(order, rule) for order, rule in zip(self.orders, rules)
+                 if not rule.is_build_only]
+        for start in range(0, len(items), self.chunk_size):
+            self._chunks.append(
+                self._compile_chunk(items[start:start + self.chunk_size]))
+
+    def _compile_chunk(self, items, force=False):
+        orders = tuple([order for order, rule in items])
+        rules = tuple([rule for order, rule in items])
+        if not force:
+            for rule in rules:
+                if rule._regex is None:
+                    # 规则的正则式还没有编译（lazy 的 map 或者加载的快照），
+                    # 分块也等到第一次用到时再编译
+                    return (None, None, orders, rules)
+        branches = []
+        for position, rule in enumerate(rules):
+            # 去掉 ^ 和 \Z，并给分组名加上前缀
+            pattern = rule._regex_source[1:-2].replace(
+                '(?P<', '(?P<_%d_' % position)
+            branches.append('(?P<_%d>%s)' % (position, pattern))
+        regex = re.compile(r'^(?:%s)\Z' % '|'.join(branches), re.UNICODE)
+        # 规则的分组紧跟在分支的分组后面，groups() 里从分支的分组号开始
+        names = dict([('_%d' % position, (position, rule,
+                                          regex.groupindex['_%d' % position]))
+                      for position, rule in enumerate(rules)])
+        return regex.match, names, orders, rules
+
+    def _chunk(self, i):
+        """The chunk at index `i`, compiled if it was deferred."""
+        chunk = self._chunks[i]
+        if chunk[0] is None:
+            # 结果总是相同的，并发时重复编译也没有关系
+            chunk = self._compile_chunk(list(zip(chunk[2], chunk[3])), True)
+            self._chunks[i] = chunk
+        return chunk
+
+    def warm_up(self):
+        BaseMatcher.warm_up(self)
+        for i in range(len(self._chunks)):
+            self._chunk(i)
+
+    def _find_chunk(self, order):
+        """Index of the last chunk that starts before `order`."""
+        return max(bisect_right([chunk[2][0] for chunk in self._chunks],
+                                order) - 1, 0)
+
+    def _copy(self, rules, orders):
+        rv = BaseMatcher._copy(self, rules, orders)
+        rv._chunks = list(self._chunks)
+        return rv
+
+    def _update(self, items, added):
+        chunks = self._chunks
+        # 先只改分块的规则列表，最后每个改过的分块只编译一次
+        changed = set()
+        for order, rule in items:
+            if rule.is_build_only or not (added or chunks):
+                continue
+            if not chunks:
+                i = 0
+                new = [[(order, rule)]]
+            else:
+                i = self._find_chunk(order)
+                part = list(zip(chunks[i][2], chunks[i][3]))
+                if added:
+                    part.insert(bisect_left(chunks[i][2], order),
+                                (order, rule))
+                else:
+                    part = [item for item in part if item[1] is not rule]
+                # 分块太大时拆成两块
+                if len(part) > self.chunk_size:
+                    half = len(part) // 2
+                    new = [part[:half], part[half:]]
+                else:
+                    new = part and [part] or []
+            new = [(None, None, tuple([order for order, rule in part]),
+                    tuple([rule for order, rule in part])) for part in new]
+            changed.update(map(id, new))
+            chunks[i:i + 1] = new
+        for i, chunk in enumerate(chunks):
+            if id(chunk) in changed:
+                chunks[i] = self._compile_chunk(list(zip(chunk[2], chunk[3])))
+
+    def iter_matches(self, subdomain, path):
+        path = u'%s|/%s' % (subdomain, path)
+        chunks = self._chunks
+        for i, chunk in enumerate(chunks):
+            if chunk[0] is None:
+                chunk = self._chunk(i)
+            m = chunk[0](path)
+            if m is not None:
+                break
+        else:
+            return
+
+        # 最外层的分组最后结束，lastgroup 就是匹配到的分支
+        position, rule, offset = chunk[1][m.lastgroup]
+        try:
+            rv = rule.convert_groups(m.groups(), offset)
+        except RequestSlash:
+            yield rule, None
+        else:
+            if rv is not None:
+                yield rule, rv
+
+        # 转换器验证失败或者方法不允许，继续尝试后面的规则
+        for rule in chunk[3][position + 1:]:
+            rv = _match_rule(rule, path)
+            if rv is not None:
+                yield rv
+        for chunk in chunks[i + 1:]:
+            for rule in chunk[3]:
+                rv = _match_rule(rule, path)
+                if rv is not None:
+                    yield rv
+
+    def trace(self, subdomain, path):
+        path = u'%s|/%s' % (subdomain, path)
+        chunks = self._chunks
+        for i in range(len(chunks)):
+            chunk = self._chunk(i)
+            m = chunk[0](path)
+            if m is None:
+                # 分块的正则式试过了块内所有的规则
+                for rule in chunk[3]:
+                    yield rule, False
+                continue
+            position, rule, offset = chunk[1][m.lastgroup]
+            for other in chunk[3][:position]:
+                yield other, False
+            try:
+                rv = rule.convert_groups(m.groups(), offset)
+            except RequestSlash:
+                yield rule, None
+            else:
+                yield rule, rv is not None and rv
+            for rule in chunk[3][position + 1:]:
+                yield rule, _check_rule(rule, path)
+            for chunk in chunks[i + 1:]:
+                for rule in chunk[3]:
+                    yield rule, _check_rule(rule, path)
+            return
+
+
+class SubdomainMatcher(BaseMatcher):
+    """
+    Partitions the rules by their subdomain and compiles one matcher of
+    the `engine` class per subdomain, so a request only looks at the rules
+    of its own subdomain.  Rules with a converter in the subdomain go into
+    every partition, in rule order, and into the wildcard matcher that
+    serves subdomains without rules of their own.
+    """
+
+    def __init__(self, rules, engine, orders=None):
+        BaseMatcher.__init__(self, rules, orders)
+        self.engine = engine
+        # subdomain -> (orders, rules)，只含该子域名自己的规则
+        self._own = {}
+        wildcard = ([], [])
+        for order, rule in zip(self.orders, rules):
+            if rule.is_build_only:
+                continue
+            if '<' in rule.subdomain:
+                items = wildcard
+            else:
+                items = self._own.setdefault(rule.subdomain, ([], []))
+            items[0].append(order)
+            items[1].append(rule)
+        self._wildcard = engine(wildcard[1], wildcard[0])
+        # subdomain -> 该子域名的匹配器
+        self._matchers = {}
+        for subdomain in self._own:
+            self._matchers[subdomain] = self._partition(subdomain)
+
+    def _partition(self, subdomain):
+        """Compile the matcher of a subdomain from scratch."""
+        own_orders, own_rules = self._own[subdomain]
+        wildcard = self._wildcard
+        items = list(merge(zip(own_orders, own_rules),
+                           zip(wildcard.orders, wildcard.rules),
+                           key=itemgetter(0)))
+        return self.engine([rule for order, rule in items],
+                           [order for order, rule in items])
+
+    def _copy(self, rules, orders):
+        rv = BaseMatcher._copy(self, rules, orders)
+        rv._own = self._own.copy()
+        rv._matchers = self._matchers.copy()
+        return rv
+
+    def _changed(self, matcher, items, added):
+        """Add or remove the rules of `items` in one partition."""
+        orders, rules = merge_items(matcher.orders, matcher.rules, items,
+                                    added)
+        return _changed_matcher(matcher, items, rules, orders, added)
+
+    def _update(self, items, added):
+        wildcard = []
+        own = {}  # subdomain -> 该子域名自己改动的规则
+        for order, rule in items:
+            if rule.is_build_only:
+                continue
+            if '<' in rule.subdomain:
+                wildcard.append((order, rule))
+            else:
+                own.setdefault(rule.subdomain, []).append((order, rule))
+        if wildcard:
+            # 动态子域名的规则在每个分区里
+            self._wildcard = self._changed(self._wildcard, wildcard, added)
+        new = set()
+        for subdomain, changes in own.items():
+            own_orders, own_rules = self._own.get(subdomain, ((), ()))
+            own_orders, own_rules = self._own[subdomain] = merge_items(
+                own_orders, own_rules, changes, added)
+            if not own_rules:
+                del self._own[subdomain], self._matchers[subdomain]
+                continue
+            if subdomain not in self._matchers:
+                self._matchers[subdomain] = self._partition(subdomain)
+                new.add(subdomain)
+        for subdomain, matcher in list(self._matchers.items()):
+            if subdomain in new:
+                continue
+            changes = own.get(subdomain, ())
+            if wildcard:
+                changes = list(merge(changes, wildcard, key=itemgetter(0)))
+            if changes:
+                self._matchers[subdomain] = self._changed(matcher, changes,
+                                                          added)
+
+    def warm_up(self):
+        self._wildcard.warm_up()
+        for matcher in list(self._matchers.values()):
+            matcher.warm_up()
+
+    def iter_matches(self, subdomain, path):
+        return self._matchers.get(subdomain, self._wildcard) \
+            .iter_matches(subdomain, path)
+
+    def match(self, subdomain, path, method):
+        return self._matchers.get(subdomain, self._wildcard) \
+            .match(subdomain, path, method)
+
+    def trace(self, subdomain, path):
+        return self._matchers.get(subdomain, self._wildcard) \
+            .trace(subdomain, path)
+
+
+def is_static(rule):
+    """Check if the subdomain and the path of a rule have no converters."""
+    for is_dynamic, data in rule._trace:
+        if is_dynamic:
+            return False
+    return True
+
+
+class StaticMatcher(BaseMatcher):
+    """
+    Puts a hash table of the rules without converters in front of another
+    matcher.  The table maps ``(subdomain, path)`` to the static rules of
+    that path in rule order; the first one that accepts the method wins.
+    Paths that are not in the table, or where no static rule accepts the
+    method, are passed on to `matcher`.
+
+    A static rule is only put into the table for a path if no converter
+    rule before it can match the path, otherwise it is left to `matcher`
+    so the result stays the same as without the table.
+    """
+
+    def __init__(self, rules, matcher, orders=None):
+        BaseMatcher.__init__(self, rules, orders)
+        self.matcher = matcher
+        self._static = {}
+        # (subdomain, path) -> [(order, rule, slash)]，该路径所有的静态规则
+        self._variants = {}
+        # subdomain -> 路径的第一段 -> set([(subdomain, path)])
+        self._prefixes = {}
+        self._dynamic_orders = []  # 动态规则的序号，升序
+        self._trie = isinstance(matcher, TrieMatcher) and matcher or None
+        for order, rule in zip(self.orders, rules):
+            if rule.is_build_only:
+                continue
+            if is_static(rule):
+                self._add_variants(order, rule)
+            else:
+                self._dynamic_orders.append(order)
+        for key in self._variants:
+            self._refresh(key)
+
+    def _rule_variants(self, rule):
+        subdomain, path = u''.join(
+            [data for is_dynamic, data in rule._trace]).split('|', 1)
+        path = path[1:]
+        # 需要补斜杠或者忽略斜杠的路径
+        variants = [(path, False)]
+        if rule.is_leaf:
+            if not rule.strict_slashes:
+                variants.append((path + '/', False))
+        elif path:
+            variants.append((path[:-1], rule.strict_slashes))
+        return [((subdomain, variant), slash) for variant, slash in variants]
+
+    def _add_variants(self, order, rule):
+        keys = []
+        for key, slash in self._rule_variants(rule):
+            variants = self._variants[key] = list(self._variants.get(key, ()))
+            insort(variants, (order, rule, slash))
+            self._prefixes.setdefault(key[0], {}).setdefault(
+                key[1].split('/', 1)[0], set()).add(key)
+            keys.append(key)
+        return keys
+
+    def _remove_variants(self, rule):
+        keys = []
+        for key, slash in self._rule_variants(rule):
+            variants = [item for item in self._variants.get(key, ())
+                        if item[1] is not rule]
+            if variants:
+                self._variants[key] = variants
+            else:
+                self._variants.pop(key, None)
+                prefixes = self._prefixes[key[0]]
+                first = key[1].split('/', 1)[0]
+                prefixes[first].discard(key)
+                if not prefixes[first]:
+                    del prefixes[first]
+            keys.append(key)
+        return keys
+
+    def _affected_keys(self, rule):
+        """The table keys a converter rule may match."""
+        segments = _rule_segments(rule)
+        if segments is None:
+            subdomains = list(self._prefixes.values())
+        else:
+            subdomains = [self._prefixes.get(rule.subdomain, {})]
+            first = segments and segments[0] or []
+            if len(first) < 2 and not (first and first[0][0]):
+                keys = subdomains[0].get(first and first[0][1] or '', ())
+                return list(keys)
+        return [key for prefixes in subdomains
+                for keys in prefixes.values() for key in keys]
+
+    def _refresh(self, key):
+        """Recompute the table entry of a path."""
+        variants = self._variants.get(key)
+        if not variants:
+            self._static.pop(key, None)
+            return
+        limit = None
+        if self._dynamic_orders and self._dynamic_orders[0] < variants[-1][0]:
+            limit = self._shadowed_from(key, variants[-1][0])
+        entries = tuple([(rule, slash) for order, rule, slash in variants
+                         if limit is None or order < limit])
+        if entries:
+            self._static[key] = entries
+        else:
+            self._static.pop(key, None)
+
+    def _shadowed_from(self, key, before):
+        """The order of the first converter rule that may match a path."""
+        if self._trie is None:
+            self._trie = TrieMatcher(self.rules, self.orders)
+        for order, rule, values, missing_slash in \
+                self._trie.candidates(key[0], key[1], None):
+            if order >= before:
+                break
+            if not is_static(rule):
+                return order
+        return None
+
+    def _copy(self, rules, orders):
+        rv = BaseMatcher._copy(self, rules, orders)
+        # dict.copy 在删除过键之后也是整块复制，比 dict() 快
+        rv._static = self._static.copy()
+        rv._variants = self._variants.copy()
+        rv._prefixes = self._prefixes.copy()
+        rv._dynamic_orders = list(self._dynamic_orders)
+        return rv
+
+    def _own_prefixes(self, rule, owned):
+        """
+        Copy the prefix sets a static rule changes, unless their ids are
+        in `owned`, the dicts and sets already copied by this change.
+        """
+        for (subdomain, path), slash in self._rule_variants(rule):
+            prefixes = self._prefixes.get(subdomain)
+            if prefixes is None or id(prefixes) not in owned:
+                prefixes = self._prefixes[subdomain] = \
+                    prefixes and prefixes.copy() or {}
+                owned.add(id(prefixes))
+            first = path.split('/', 1)[0]
+            keys = prefixes.get(first)
+            if keys is None or id(keys) not in owned:
+                keys = prefixes[first] = set(keys or ())
+                owned.add(id(keys))
+
+    def _update(self, items, added):
+        shared = self._trie is self.matcher
+        self.matcher = _changed_matcher(self.matcher, items, self.rules,
+                                        self.orders, added)
+        if shared:
+            self._trie = self.matcher
+        elif self._trie is not None:
+            self._trie = _changed_matcher(self._trie, items, self.rules,
+                                          self.orders, added)
+        # 所有规则改完之后，每个受影响的路径只重新计算一次
+        owned = set()
+        keys = set()
+        for order, rule in items:
+            if rule.is_build_only:
+                continue
+            if is_static(rule):
+                self._own_prefixes(rule, owned)
+                if added:
+                    keys.update(self._add_variants(order, rule))
+                else:
+                    keys.update(self._remove_variants(rule))
+            elif added:
+                insort(self._dynamic_orders, order)
+                keys.update(self._affected_keys(rule))
+            else:
+                del self._dynamic_orders[bisect_left(self._dynamic_orders,
+                                                     order)]
+                keys.update(self._affected_keys(rule))
+        for key in keys:
+            self._refresh(key)
+
+    def warm_up(self):
+        self.matcher.warm_up()
+
+    def iter_matches(self, subdomain, path):
+        return self.matcher.iter_matches(subdomain, path)
+
+    def match(self, subdomain, path, method):
+        for rule, slash in self._static.get((subdomain, path), ()):
+            if rule.methods is None or method in rule.methods:
+                if slash:
+                    raise RequestSlash()
+                return rule, {}
+        return self.matcher.match(subdomain, path, method)
+
+    def trace(self, subdomain, path):
+        entries = self._static.get((subdomain, path), ())
+        for rule, slash in entries:
+            yield rule, None if slash else {}
+        # 表里的规则已经检查过，匹配器再检查一遍时跳过
+        seen = set([id(rule) for rule, slash in entries])
+        for item in self.matcher.trace(subdomain, path):
+            if id(item[0]) not in seen:
+                yield item
+
+
+class CachingMatcher(BaseMatcher):
+    """
+    Remembers the path-level matches of another matcher in a
+    :class:`LRUCache` keyed on ``(subdomain, path)``, so one entry serves
+    every request method.  The matches are collected up to the first rule
+    that accepts all methods, later rules can never win.  Paths without
+    matches are cached as well.  The copies made when rules change start
+    with an empty cache that keeps the counters.
+    """
+
+    def __init__(self, rules, matcher, cache, orders=None):
+        BaseMatcher.__init__(self, rules, orders)
+        self.matcher = matcher
+        self.cache = cache
+
+    def _update(self, items, added):
+        self.matcher = _changed_matcher(self.matcher, items, self.rules,
+                                        self.orders, added)
+        self.cache = self.cache.empty_copy()
+
+    def warm_up(self):
+        self.matcher.warm_up()
+
+    def iter_matches(self, subdomain, path):
+        key = (subdomain, path)
+        cache = self.cache
+        matches = cache.get(key)
+        if matches is None:
+            matches = []
+            for rule, rv in self.matcher.iter_matches(subdomain, path):
+                matches.append((rule, rv))
+                if rule.methods is None:
+                    break
+            matches = tuple(matches)
+            cache.set(key, matches)
+        return matches
+
+    def match(self, subdomain, path, method):
+        rule, rv = resolve_method(self.iter_matches(subdomain, path), method)
+        # 返回副本，调用者可能会修改参数
+        return rule, dict(rv)
+
+    def trace(self, subdomain, path):
+        # 不查缓存，和没有缓存时做的工作相同
+        return self.matcher.trace(subdomain, path)
+
+
+# 可选的匹配引擎
+MATCHERS = {
+    'linear':           LinearMatcher,
+    'trie':             TrieMatcher,
+    'regex':            RegexMatcher,
+}
@@ -0,0 +1,199 @@
+"""
+访问日志回放
+
+Match the requests of an access log against a file of rules on a process
+pool and report the hits per endpoint and the rate of 404s::
+
+    python -m url_router.replay rules.txt access.log --processes 8
+
+The rules file has one rule per line: the rule string, the endpoint and
+optionally a comma separated list of methods.  Empty lines and lines
+starting with ``#`` are ignored::
+
+    /                   index
+    /user/<int:id>      user        GET,POST
+
+The log may be in common log format (the request line is read from the
+first quoted field) or contain one ``METHOD /path`` or ``/path`` per line.
+
+The map is built once in the main process and pickled to the workers
+with its parsed rules, so the workers do not parse the rules again.  The
+log is split into byte ranges that every worker reads on its own, only the
+counters travel back to the main process.
+"""
+
+import argparse
+import json
+import os
+import pickle
+import re
+import sys
+from collections import Counter
+from multiprocessing import Pool
+from urllib.parse import unquote
+
+from .exceptions import NotFound, MethodNotAllowed, RequestRedirect
+from .map import Map
+from .rule import Rule
+
+
+# 每个任务读取的日志大小
+CHUNK_SIZE = 64 * 1024 * 1024
+
+# common log format 的请求行
+_request_re = re.compile(r'"([A-Za-z]+) (\S+)[^"]*"')
+
+_adapter = None  # 工作进程的 MapAdapter
+
+
+def load_rules(filename, **kwargs):
+    """Read a rules file and return a :class:`Map`."""
+    rules = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split()
+            if len(parts) not in (2, 3):
+                raise ValueError('malformed rule line: %r' % line)
+            methods = None
+            if len(parts) == 3:
+                methods = parts[2].split(',')
+            rules.append(Rule(parts[0], endpoint=parts[1], methods=methods))
+    return Map(rules, **kwargs)
+
+
+def parse_line(line):
+    """Return ``(method, path)`` of a log line or `None`."""
+    m = _request_re.search(line)
+    if m is not None:
+        method, path = m.groups()
+    else:
+        parts = line.split()
+        if len(parts) == 1:
+            method, path = 'GET', parts[0]
+        elif len(parts) == 2:
+            method, path = parts
+        else:
+            return None
+    return method, unquote(path.split('?', 1)[0])
+
+
+def iter_chunks(filename, chunk_size=CHUNK_SIZE):
+    """Split a file into ``(filename, start, end)`` byte ranges."""
+    size = os.path.getsize(filename)
+    for start in range(0, size, chunk_size):
+        yield filename, start, min(start + chunk_size, size)
+
+
+def _init_worker(data, server_name):
+    global _adapter
+    _adapter = pickle.loads(data).bind(server_name)
+
+
+def count_chunk(chunk):
+    """
+    Match the lines that start in the byte range of a chunk and return a
+    :class:`Counter` of endpoint hits plus the ``404``, ``405``,
+    ``redirect`` and ``invalid`` pseudo keys.
+    """
+    filename, start, end = chunk
+    counts = Counter()
+    match = _adapter.match
+    with open(filename, 'rb') as f:
+        if start:
+            # 上一个块负责跨越边界的行
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            request = parse_line(line.decode('utf-8', 'replace'))
+            if request is None:
+                counts['invalid'] += 1
+                continue
+            method, path = request
+            try:
+                endpoint, args = match(path, method)
+            except NotFound:
+                counts['404'] += 1
+            except MethodNotAllowed:
+                counts['405'] += 1
+            except RequestRedirect:
+                counts['redirect'] += 1
+            else:
+                counts[endpoint] += 1
+    return counts
+
+
+def replay(map, filename, server_name='localhost', processes=None,
+           chunk_size=CHUNK_SIZE):
+    """
+    Match an access log against a map on a process pool and return the
+    merged :class:`Counter`.
+    """
+    data = pickle.dumps(map, pickle.HIGHEST_PROTOCOL)
+    total = Counter()
+    with Pool(processes, _init_worker, (data, server_name)) as pool:
+        for counts in pool.imap_unordered(
+                count_chunk, iter_chunks(filename, chunk_size)):
+            total.update(counts)
+    return total
+
+
+def report(counts):
+    """Turn the counters into a report dict."""
+    invalid = counts.pop('invalid', 0)
+    not_found = counts.pop('404', 0)
+    not_allowed = counts.pop('405', 0)
+    redirects = counts.pop('redirect', 0)
+    requests = sum(counts.values()) + not_found + not_allowed + redirects
+    return {
+        'requests': requests,
+        'invalid': invalid,
+        'redirects': redirects,
+        'not_found': not_found,
+        'not_found_rate': requests and float(not_found) / requests or 0.0,
+        'method_not_allowed': not_allowed,
+        'endpoints': dict(counts.most_common()),
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m url_router.replay',
+        description='Replay an access log against a file of url rules.')
+    parser.add_argument('rules', help='rules file')
+    parser.add_argument('log', help='access log')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes')
+    parser.add_argument('--server-name', default='localhost')
+    parser.add_argument('--engine', default='trie')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='bytes of log per task')
+    parser.add_argument('--json', action='store_true',
+                        help='print the report as JSON')
+    args = parser.parse_args(args)
+
+    map = load_rules(args.rules, engine=args.engine)
+    rv = report(replay(map, args.log, args.server_name, args.processes,
+                       args.chunk_size))
+    if args.json:
+        json.dump(rv, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+    for endpoint, hits in rv['endpoints'].items():
+        print('%-30s %10d' % (endpoint, hits))
+    print('%-30s %10d' % ('(redirects)', rv['redirects']))
+    print('%-30s %10d' % ('(404)', rv['not_found']))
+    print('%-30s %10d' % ('(405)', rv['method_not_allowed']))
+    print('requests: %d, invalid lines: %d, 404 rate: %.2f%%' % (
+        rv['requests'], rv['invalid'], rv['not_found_rate'] * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,12 @@
 import re
 import operator
+from sys import intern
 from .exceptions import ValidationError, RequestSlash
-from .utils import url_encode
+from .utils import query_encoder, LRUCache
+from .converters import BaseConverter
+
+# 转换器参数解析缓存的大小
+CONVERTER_ARGS_CACHE_SIZE = 256
 
 # 规则正则式
 _rule_re = re.compile(r'''
@@ -52,28 +57,130 @@ def parse_rule(rule):
         yield None, None, remaining
 
 
+# 转换器参数，例如 ``int(fixed_digits=4, min=1)`` 括号中的部分
+_converter_args_re = re.compile(r'''
+    \s*
+    (?:(?P<name>[a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*)?   # keyword
+    (?:
+        (?P<string>"[^"]*"|'[^']*')                 # quoted string
+        |
+        (?P<number>[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+        |
+        (?P<word>[a-zA-Z_][a-zA-Z0-9_]*)            # constant or bare word
+    )
+    \s*(?:,|\Z)
+''', re.VERBOSE)
+
+_python_constants = {'None': None, 'True': True, 'False': False}
+
+# 解析过的转换器参数
+_converter_args_cache = LRUCache(CONVERTER_ARGS_CACHE_SIZE)
+
+
+def _pythonize(m):
+    value = m.group('string')
+    if value is not None:
+        return value[1:-1]
+    value = m.group('number')
+    if value is not None:
+        if '.' in value or 'e' in value or 'E' in value:
+            return float(value)
+        return int(value)
+    value = m.group('word')
+    return _python_constants.get(value, value)
+
+
+def parse_converter_args(argstr):
+    """
+    Parse the arguments of a converter into ``(args, kwargs)``.  Only
+    literals are accepted: numbers, quoted strings, ``True``, ``False``
+    and ``None``.  Other bare words are passed as strings.  The parsed
+    arguments are cached, so rules sharing an argument string parse it
+    once.
+
+
+    解析转换器参数，代替 eval。
+    """
+    rv = _converter_args_cache.get(argstr)
+    if rv is None:
+        args = []
+        kwargs = []
+        pos = 0
+        end = len(argstr.rstrip())
+        while pos < end:
+            m = _converter_args_re.match(argstr, pos)
+            if m is None:
+                raise ValueError('malformed converter arguments: %r' % argstr)
+            name = m.group('name')
+            if name is None:
+                if kwargs:
+                    raise ValueError('positional converter argument after '
+                                     'keyword argument: %r' % argstr)
+                args.append(_pythonize(m))
+            else:
+                kwargs.append((name, _pythonize(m)))
+            pos = m.end()
+        rv = tuple(args), tuple(kwargs)
+        _converter_args_cache.set(argstr, rv)
+    return rv[0], dict(rv[1])
+
+
 def get_converter(map, name, args):
     """
     Create a new converter for the given arguments or raise
-    exception if the converter does not exist.
+    exception if the converter does not exist.  Rules of a map with the
+    same converter and arguments share one converter instance.
 
 
     获取转换器
     如果转换器不存在的话，则对给定参数创建一个新的转换器，或抛出的异常。
+    相同转换器和参数的规则共用同一个实例。
     """
     if not name in map.converters:
         raise LookupError('the converter %r does not exist' % name)
     if args:
-        storage = type('_Storage', (), {'__getitem__': lambda s, x: x})()
-        args, kwargs = eval('(lambda *a, **kw: (a, kw))(%s)' %
-                            args, {}, storage)
+        args, kwargs = parse_converter_args(args)
     else:
         args = ()
         kwargs = {}
-    return map.converters[name](map, *args, **kwargs)
+    key = (name, args, tuple(sorted(kwargs.items())))
+    convobj = map._converter_cache.get(key)
+    if convobj is None:
+        convobj = map.converters[name](map, *args, **kwargs)
+        map._converter_cache[key] = convobj
+    return convobj
+
+
+def _append_static(plan, data):
+    """Append static data to a build plan, merged with a static tail."""
+    if not data:
+        return
+    if plan and plan[-1].__class__ is str:
+        plan[-1] += data
+    else:
+        plan.append(data)
+
+
+def _compile_plan(plan):
+    if not plan:
+        return u''
+    if len(plan) == 1 and plan[0].__class__ is str:
+        return plan[0]
+    return tuple(plan)
+
+
+def _run_plan(plan, values):
+    tmp = []
+    for part in plan:
+        if part.__class__ is str:
+            tmp.append(part)
+        else:
+            tmp.append(part[1](values[part[0]]))
+    return u''.join(tmp)
 
 
 class RuleFactory(object):
+    __slots__ = ()
 
     def get_rules(self, map):
         raise NotImplementedError()
@@ -83,13 +190,19 @@ class Rule(RuleFactory):
     """
     Represents one url pattern.
     """
+    __slots__ = ('rule', 'is_leaf', 'map', 'subdomain', 'is_build_only',
+                 'strict_slashes', 'methods', 'endpoint', 'greediness',
+                 '_static_weights', '_argument_weights', 'arguments',
+                 '_trace', '_converters', '_regex', '_regex_source',
+                 '_build_subdomain', '_build_path', '_match_plan',
+                 '_suffix_group')
 
     def __init__(self, string, subdomain=None, methods=None,
                  build_only=False, endpoint=None, strict_slashes=None):
         """
         :param string: str, URL
         :param subdomain: str
-        :param methods: list
+        :param methods: iterable, 保存为大写的 frozenset
         :param build_only: bool
         :param endpoint: str
         :param strict_slashes: bool, 严格的斜杠
@@ -106,20 +219,27 @@ class Rule(RuleFactory):
         if methods is None:
             self.methods = None
         else:
-            self.methods = m = []
-            for method in methods:
-                m.append(method.upper())
-            # self.methods.sort(lambda a, b: cmp(len(b), len(a)))
+            self.methods = frozenset([method.upper() for method in methods])
         self.endpoint = endpoint
         self.greediness = 0
+        # 排序用的权重，见 :meth:`match_compare_key`
+        self._static_weights = ()
+        self._argument_weights = ()
 
         # 转换器参数
-        self.arguments = set()
-        self._trace = []  # [(bool, variable)]
+        self.arguments = frozenset()
+        self._trace = ()  # ((bool, variable), ...)
         # 转换器
         self._converters = {}
-        # 该规则的正则表达式
+        # 该规则的正则表达式及其源码，反序列化后按需编译
         self._regex = None
+        self._regex_source = None
+        # 预编译的 build 计划，见 :meth:`compile_builder`
+        self._build_subdomain = None
+        self._build_path = None
+        # 预编译的匹配计划，见 :meth:`compile_match_plan`
+        self._match_plan = ()
+        self._suffix_group = 0
 
     def get_rules(self, map):
         yield self
@@ -151,108 +271,210 @@ class Rule(RuleFactory):
         )
 
         regex_parts = []
+        trace = []
+        names = []
+        static_weights = []
+        argument_weights = []
         # 循环解析规则，解析部分正则式放进 regex_parts
-        for converter, arguments, variable in parse_rule(rule):
+        for index, (converter, arguments, variable) in \
+                enumerate(parse_rule(rule)):
+            variable = intern(variable)
             if converter is None:
                 # 静态部分
                 regex_parts.append(re.escape(variable))
-                self._trace.append((False, variable))
+                trace.append((False, variable))
+                for part in variable.split('/'):
+                    if part:
+                        static_weights.append((index, -len(part)))
             else:
                 # 动态部分
                 convobj = get_converter(map, converter, arguments)
                 regex_parts.append('(?P<%s>%s)' % (variable, convobj.regex))
                 self._converters[variable] = convobj
-                self._trace.append((True, variable))
-                self.arguments.add(str(variable))  # 添加参数
+                trace.append((True, variable))
+                names.append(variable)  # 添加参数
+                argument_weights.append(convobj.weight)
                 if convobj.is_greedy:  # 贪婪的
                     self.greediness += 1
         if not self.is_leaf:
-            self._trace.append((False, '/'))
-
-        # method
-        if self.methods is None:
-            method_re = '[^>]*'
-        else:
-            method_re = '|'.join([re.escape(x) for x in self.methods])
+            trace.append((False, '/'))
+        # 绑定后不再修改，用 tuple 和 frozenset 节省内存
+        self._trace = tuple(trace)
+        self.arguments = frozenset(names)
+        self._static_weights = tuple(static_weights)
+        self._argument_weights = tuple(argument_weights)
+        self.compile_builder()
+        self.compile_match_plan()
 
         if not self.is_build_only:
-            # 拼接正则式
-            regex = r'^%s%s\(%s\)$' % (
+            # 拼接正则式，方法不放进正则式，由匹配器单独检查
+            regex = r'^%s%s\Z' % (
                 u''.join(regex_parts),
                 (not self.is_leaf or not self.strict_slashes) and
-                '(?<!/)(?P<__suffix__>/?)' or '',
-                method_re
+                '(?<!/)(?P<__suffix__>/?)' or ''
             )
-            # print(regex)
-            # re编译并赋值给 self._regex
-            self._regex = re.compile(regex, re.UNICODE)
+            # re编译并赋值给 self._regex，lazy 的 map 在第一次匹配时才编译
+            self._regex_source = regex
+            if not map.lazy:
+                self._regex = re.compile(regex, re.UNICODE)
+
+    def get_regex(self):
+        """
+        Return the compiled regex of the rule.  Rules of a `lazy` map and
+        unpickled rules only carry the regex source, it is compiled on
+        first use.
+        """
+        if self._regex is None and self._regex_source is not None:
+            self._regex = re.compile(self._regex_source, re.UNICODE)
+        return self._regex
 
     def match(self, path):
         """ rule.match
 
-        检查规则是否匹配给定的路径。路径是一个在 "subdomain|/path(method)" 的字符串，
-        并且由 map 组装。
+        检查规则是否匹配给定的路径。路径是一个在 "subdomain|/path" 的字符串，
+        并且由 map 组装。请求方法不在这里检查，见 :attr:`methods` 。
 
         如果rule使用转换器匹配了一个字典，将会返回一个值。否则返回None。
         """
         if self.is_build_only:
             return None
 
+        regex = self._regex
+        if regex is None:
+            regex = self.get_regex()
         # re.search: 扫描整个字符串并返回第一个成功的匹配。
-        m = self._regex.search(path)
+        m = regex.search(path)
         if m is None:
             return None
 
-        groups = m.groupdict()
+        return self.convert_groups(m.groups())
+
+    def compile_match_plan(self):
+        """
+        Precompute how the arguments are read from the groups of a match:
+        `_match_plan` is a tuple of ``(name, index, to_python)`` in rule
+        order, where `index` is the position in ``match.groups()`` and
+        `to_python` is `None` for converters that return the value as is.
+        `_suffix_group` is the position of the trailing slash group plus
+        one if a missing slash has to redirect, otherwise ``0``.
+
+
+        预编译匹配计划，匹配时按位置读取分组，不再构造 groupdict。
+        """
+        plan = []
+        index = 0
+        for is_dynamic, data in self._trace:
+            if not is_dynamic:
+                continue
+            convobj = self._converters[data]
+            to_python = convobj.to_python
+            if getattr(to_python, '__func__', None) is \
+                    BaseConverter.to_python:
+                to_python = None
+            plan.append((str(data), index, to_python))
+            # 转换器的正则式里也可能有分组
+            index += 1 + re.compile(convobj.regex).groups
+        self._match_plan = tuple(plan)
+        if self.strict_slashes and not self.is_leaf:
+            self._suffix_group = index + 1
+        else:
+            self._suffix_group = 0
+
+    def convert_groups(self, groups, offset=0):
+        """
+        Turn the groups of a regex match of this rule, as returned by
+        ``match.groups()``, into the dict of arguments.  The groups of the
+        rule start at `offset`, so matchers that run the rule regex as part
+        of a bigger one can pass all groups of their match.  Returns `None`
+        if a converter does not accept its value.
+        """
         # we have a folder like part of the url without a trailing
         # slash and strict slashes enabled. raise an exception that
         # tells the map to redirect to the same url but with a
         # trailing slash
-        if self.strict_slashes and not self.is_leaf and \
-                not groups.pop('__suffix__'):
+        suffix = self._suffix_group
+        if suffix and not groups[offset + suffix - 1]:
             raise RequestSlash()
-        # if we are not in strict slashes mode we have to remove a __suffix__
-        # 非严格斜杠模式下我们需要移除 __suffix__
-        elif not self.strict_slashes:
-            del groups['__suffix__']
 
         result = {}
-        # 循环处理URL中的动态参数
-        for name, value in groups.items():
-            try:
-                value = self._converters[name].to_python(value)
-            except ValidationError:
-                return
-            result[str(name)] = value
+        # 循环处理URL中的动态参数，恒等转换器不调用 to_python
+        try:
+            for name, index, to_python in self._match_plan:
+                if to_python is None:
+                    result[name] = groups[offset + index]
+                else:
+                    result[name] = to_python(groups[offset + index])
+        except ValidationError:
+            return
         return result
 
+    def compile_builder(self):
+        """
+        Precompile the build plan of the rule from `_trace`: the subdomain
+        and the path are split ahead of time and adjacent static parts are
+        merged.  A plan without converters is stored as plain string,
+        otherwise as tuple of static strings and ``(name, to_url)`` pairs.
+
+
+        预编译 build 计划，build 时不再遍历 `_trace` 和切分子域名。
+        """
+        plans = ([], [])
+        plan = plans[0]
+        for is_dynamic, data in self._trace:
+            if is_dynamic:
+                plan.append((data, self._converters[data].to_url))
+                continue
+            if plan is plans[0] and '|' in data:
+                subdomain, data = data.split('|', 1)
+                _append_static(plan, subdomain)
+                plan = plans[1]
+            _append_static(plan, data)
+        self._build_subdomain, self._build_path = [
+            _compile_plan(plan) for plan in plans
+        ]
+
     def build(self, values):
         """ rule.build
         Assembles the relative url for that rule and the subdomain.
         If building doesn't work for some reasons `None` is returned.
         """
-        tmp = []
-        processed = set(self.arguments)
-        for is_dynamic, data in self._trace:
-            if is_dynamic:
-                try:
-                    tmp.append(self._converters[data].to_url(values[data]))
-                except ValidationError:
-                    return
-                processed.add(data)
-            else:
-                tmp.append(data)
-        subdomain, url = (u''.join(tmp)).split('|', 1)
-
-        # 拼接 query string
-        query_vars = {}
-        for key in set(values) - processed:
-            query_vars[key] = str(values[key])
-        if query_vars:
-            url += '?' + url_encode(query_vars, self.map.charset)
+        subdomain = self._build_subdomain
+        url = self._build_path
+        try:
+            if subdomain.__class__ is not str:
+                subdomain = _run_plan(subdomain, values)
+            if url.__class__ is not str:
+                url = _run_plan(url, values)
+        except ValidationError:
+            return
+
+        # 拼接 query string，按 values 的顺序，跳过规则自己的参数
+        if len(values) > len(self.arguments):
+            query = query_encoder(self.map.charset).encode(values,
+                                                           self.arguments)
+            if query:
+                url += '?' + query
 
         return subdomain, url
 
+    def match_compare_key(self):
+        """
+        The sort key used by :meth:`Map.update` to order the rules for
+        matching.
+
+        1.  rules without converters come first
+        2.  the more static parts, the earlier, longer static parts and
+            static parts closer to the start win
+        3.  rules with greedy converters come after the others with the
+            same static parts
+        4.  the more converters, the earlier, converters with a lower
+            `weight` (the stricter ones) win
+        """
+        return (bool(self.arguments),
+                -len(self._static_weights), self._static_weights,
+                self.greediness,
+                -len(self._argument_weights), self._argument_weights)
+
     def provides_defaults_for(self, rule):
         """Check if this rule has defaults for a given rule."""
         return not self.is_build_only and \
@@ -275,6 +497,24 @@ class Rule(RuleFactory):
 
         return True
 
+    def __getstate__(self):
+        # build 计划和匹配计划里有绑定方法，反序列化时重新编译；
+        # 正则式只保留源码，见 :meth:`get_regex`
+        state = dict([(name, getattr(self, name))
+                      for name in Rule.__slots__])
+        state.update(getattr(self, '__dict__', ()))  # 子类的属性
+        state['_build_subdomain'] = state['_build_path'] = None
+        state['_match_plan'] = ()
+        state['_regex'] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        if self.map is not None:
+            self.compile_builder()
+            self.compile_match_plan()
+
     def __eq__(self, other):
         return self.__class__ is other.__class__ and \
             self._trace == other._trace
@@ -282,17 +522,12 @@ class Rule(RuleFactory):
     def __ne__(self, other):
         return not self.__eq__(other)
 
-    def __unicode__(self):
-        return self.rule
-
     def __str__(self):
-        charset = self.map is not None and self.map.charset or 'utf-8'
-        return str(self).encode(charset)
+        return self.rule
 
     def __repr__(self):
         if self.map is None:
             return '<%s (unbound)>' % self.__class__.__name__
-        charset = self.map is not None and self.map.charset or 'utf-8'
         tmp = []
         for is_dynamic, data in self._trace:
             if is_dynamic:
@@ -301,8 +536,8 @@ class Rule(RuleFactory):
                 tmp.append(data)
         return '<%s %r%s -> %s>' % (
             self.__class__.__name__,
-            (u''.join(tmp).encode(charset)).lstrip('|'),
+            u''.join(tmp).lstrip('|'),
             self.methods is not None and ' (%s)' %
-            ', '.join(self.methods) or '',
+            ', '.join(sorted(self.methods)) or '',
             self.endpoint
         )
@@ -1,33 +1,233 @@
+from collections import OrderedDict
 from urllib.parse import quote, quote_plus
 
 
+# 查询参数编码缓存的大小，缓存满了就清空
+QUOTE_CACHE_SIZE = 1024
+
+# 只缓存不超过这个长度的值，长的值很少重复
+QUOTE_CACHE_MAX_LENGTH = 32
+
+
+class QueryEncoder(object):
+    """Encode query strings and remember the quoted keys and short values.
+
+    `obj` may be a dict or an iterable of ``(key, value)`` pairs and is
+    encoded in its own order.  A list or tuple value gives the key once
+    per item, `None` values are skipped.  Values that are not strings are
+    converted with `str`, strings are encoded with the charset.
+
+    Usage::
+
+        >>> encoder = QueryEncoder()
+        >>> encoder.encode([('q', 'a b'), ('tag', ['x', 'y']), ('page', 2)])
+        'q=a+b&tag=x&tag=y&page=2'
+        >>> encoder.encode({'id': 1, 'sort': '-date', 'empty': None},
+        ...                skip=frozenset(['id']))
+        'sort=-date'
+        >>> sorted(encoder._values)
+        ['-date', '2', 'a b', 'x', 'y']
+
+    :param charset: str
+    :param maxsize: int, 每个缓存最多的条目数
+    :param max_length: int, 缓存的值最大的长度
+    """
+
+    def __init__(self, charset='utf-8', maxsize=QUOTE_CACHE_SIZE,
+                 max_length=QUOTE_CACHE_MAX_LENGTH):
+        self.charset = charset
+        self.maxsize = maxsize
+        self.max_length = max_length
+        self._keys = {}    # key -> 加上等号的编码结果
+        self._values = {}  # 短的值 -> 编码结果
+
+    def _quote_key(self, key):
+        rv = quote(key) + '='
+        keys = self._keys
+        if len(keys) >= self.maxsize:
+            keys.clear()
+        keys[key] = rv
+        return rv
+
+    def _quote_value(self, value):
+        if value.__class__ is not str:
+            if isinstance(value, bytes):
+                return quote_plus(value)
+            value = str(value)
+            rv = self._values.get(value)
+            if rv is not None:
+                return rv
+        rv = quote_plus(value.encode(self.charset))
+        if len(value) <= self.max_length:
+            values = self._values
+            if len(values) >= self.maxsize:
+                values.clear()
+            values[value] = rv
+        return rv
+
+    def encode(self, obj, skip=()):
+        """Return the query string of `obj` without the keys in `skip`."""
+        if obj is None:
+            return ''
+        if isinstance(obj, dict):
+            obj = obj.items()
+        keys = self._keys
+        values = self._values
+        tmp = []
+        for key, value in obj:
+            if value is None or key in skip:
+                continue
+            quoted_key = keys.get(key)
+            if quoted_key is None:
+                quoted_key = self._quote_key(key)
+            if value.__class__ is list or value.__class__ is tuple:
+                for item in value:
+                    if item is None:
+                        continue
+                    quoted = item.__class__ is str and values.get(item)
+                    if not quoted:
+                        quoted = self._quote_value(item)
+                    tmp.append(quoted_key + quoted)
+                continue
+            # 值是字符串时直接查缓存
+            quoted = value.__class__ is str and values.get(value)
+            if not quoted:
+                quoted = self._quote_value(value)
+            tmp.append(quoted_key + quoted)
+        return '&'.join(tmp)
+
+
+# charset -> QueryEncoder
+_query_encoders = {}
+
+
+def query_encoder(charset='utf-8'):
+    """Return the shared :class:`QueryEncoder` of a charset."""
+    rv = _query_encoders.get(charset)
+    if rv is None:
+        rv = _query_encoders[charset] = QueryEncoder(charset)
+    return rv
+
+
 def url_encode(obj, charset='utf-8'):
     """Urlencode a dict.
 
-    把字典转换成 URL 字符串
+    把字典转换成 URL 字符串，见 :class:`QueryEncoder`
 
     Usage::
 
         >>> url_encode({'key1': 'value1', 'key2': 123, 'key3': 3.14})
         'key1=value1&key2=123&key3=3.14'
+        >>> url_encode([('key', ['a', 'b'])])
+        'key=a&key=b'
 
-    :param obj: dict
+    :param obj: dict or iterable of ``(key, value)`` pairs
     :param charset: str
     """
-    if obj is None:
-        items = []
-    elif isinstance(obj, dict):
-        items = [(key, [value]) for key, value in obj.items()]
-    else:
-        items = obj
-    tmp = []
-    for key, values in items:
-        for value in values:
-            if value is None:
-                continue
-            elif isinstance(value, str):
-                value = value.encode(charset)
-            else:
-                value = str(value)
-            tmp.append('%s=%s' % (quote(key), quote_plus(value)))
-    return '&'.join(tmp)
+    return query_encoder(charset).encode(obj)
+
+
+def split_subdomain(host, server_name):
+    """Return the subdomain of a host for a map bound to `server_name`.
+
+    返回 host 相对于 server_name 的子域名，host 不属于 server_name 时返回
+    `None` ，端口会被忽略
+
+    Usage::
+
+        >>> split_subdomain('staging.dev.example.com:8080', 'example.com')
+        'staging.dev'
+        >>> split_subdomain('example.com', 'example.com:8080')
+        ''
+        >>> split_subdomain('example.org', 'example.com') is None
+        True
+
+    :param host: str
+    :param server_name: str
+    """
+    cur_server_name = host.split(':', 1)[0].split('.')
+    real_server_name = server_name.split(':', 1)[0].split('.')
+    offset = -len(real_server_name)
+    if cur_server_name[offset:] != real_server_name:
+        return None
+    return '.'.join(filter(None, cur_server_name[:offset]))
+
+
+class LRUCache(object):
+    """A bounded mapping that drops the least recently used item.
+
+    The cache counts hits, misses and evictions so the size can be tuned.
+
+    Usage::
+
+        >>> cache = LRUCache(2)
+        >>> cache.set('a', 1)
+        >>> cache.set('b', 2)
+        >>> cache.get('a')
+        1
+        >>> cache.set('c', 3)
+        >>> cache.get('b') is None
+        True
+        >>> cache.hits, cache.misses, cache.evictions
+        (1, 1, 1)
+
+    :param maxsize: int
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+            self._data.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        data = self._data
+        data[key] = value
+        data.move_to_end(key)
+        while len(data) > self.maxsize:
+            try:
+                data.popitem(last=False)
+            except KeyError:
+                break
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+
+    def empty_copy(self):
+        """Return an empty cache of the same size that keeps the counters.
+
+            >>> cache = LRUCache(2)
+            >>> cache.get('a')
+            >>> cache.empty_copy().info()['misses']
+            1
+        """
+        rv = LRUCache(self.maxsize)
+        rv.hits = self.hits
+        rv.misses = self.misses
+        rv.evictions = self.evictions
+        return rv
+
+    def info(self):
+        """Return the counters and the size of the cache as dict."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }